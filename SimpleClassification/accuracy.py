@@ -0,0 +1,123 @@
+import bisect
+import math
+
+import metrics
+from pointset import UNASSIGNED
+from spatial import GridIndex
+
+
+class LeaveOneOut:
+    # Track the leave-one-out KNN accuracy of a growing set of labelled
+    # points. Each point keeps its k nearest neighbors (excluding itself)
+    # and its prediction. When a point is added, a reverse-kNN query finds
+    # the points it becomes a neighbor of, and only those are updated.
+    # Each grid cell keeps the largest kth-neighbor radius of its points,
+    # so the query only looks at cells with a point whose neighborhood
+    # reaches the new point.
+    def __init__(self, points, k, cell_size):
+        self.points = points
+        self.k = k
+        self.index = GridIndex(points, cell_size)
+        self.neighbors = []
+        self.correct = bytearray()
+        self.num_correct = 0
+
+        # Squared distance to each point's kth neighbor (infinite while it
+        # has fewer than k), and the largest of them in each cell.
+        self.radius2 = []
+        self.cell_radius2 = {}
+
+        for i in range(len(points)):
+            self.track(i)
+
+    # Return the accuracy as a percentage.
+    def accuracy(self):
+        if len(self.correct) == 0:
+            return 0.0
+        return 100 * self.num_correct / len(self.correct)
+
+    # Add a labelled point and update the affected predictions.
+    # Return the number of points whose neighbor lists changed.
+    def add(self, x, y, name):
+        i = self.points.add(x, y, name)
+        self.index.insert(i)
+
+        # Reverse kNN: the new point enters the neighborhood of every point
+        # that is closer to it than that point's current kth neighbor. Walk
+        # the rings of cells outward, skip cells whose largest radius does
+        # not reach the new point, and stop once the rings are farther away
+        # than any cell's radius.
+        xs, ys = self.points.xs, self.points.ys
+        index = self.index
+        cell_radius2 = self.cell_radius2
+        max_radius2 = max(cell_radius2.values(), default=0.0)
+        column, row = index.cell(x, y)
+        affected = []
+        num_distances = 0
+        ring = 0
+        while True:
+            for cell in index.ring_cells(column, row, ring):
+                members = index.cells.get(cell)
+                if members is None:
+                    continue
+                if index.cell_distance2(x, y, cell) > cell_radius2.get(cell, 0.0):
+                    continue
+                num_distances += len(members)
+                for j in members:
+                    if j == i:
+                        continue
+                    # kernels.sq_euclidean, inlined for the inner loop.
+                    dx = xs[j] - x
+                    dy = ys[j] - y
+                    d2 = dx * dx + dy * dy
+                    neighbors = self.neighbors[j]
+                    if len(neighbors) == self.k and (d2, i) >= neighbors[-1]:
+                        continue
+                    bisect.insort(neighbors, (d2, i))
+                    if len(neighbors) > self.k:
+                        neighbors.pop()
+                    if len(neighbors) == self.k:
+                        self.radius2[j] = neighbors[-1][0]
+                    self.update_prediction(j)
+                    affected.append(j)
+            if index.covers_all(column, row, ring):
+                break
+            margin = index.block_margin(x, y, column, row, ring)
+            if margin * margin > max_radius2:
+                break
+            ring += 1
+        metrics.count("distances", num_distances)
+
+        # The affected points' radii shrank, so recompute their cells'
+        # largest radius.
+        self.track(i)
+        radius2 = self.radius2
+        for cell in {index.cell(xs[j], ys[j]) for j in affected}:
+            cell_radius2[cell] = max(map(radius2.__getitem__, index.cells[cell]))
+        return len(affected)
+
+    # Find the neighbors and prediction of point `i`, which must already
+    # be in the index.
+    def track(self, i):
+        xs, ys = self.points.xs, self.points.ys
+        neighbors = self.index.nearest(xs[i], ys[i], self.k, exclude=i)
+        self.neighbors.append(neighbors)
+        self.correct.append(0)
+        if len(neighbors) == self.k:
+            self.radius2.append(neighbors[-1][0])
+        else:
+            self.radius2.append(math.inf)
+        cell = self.index.cell(xs[i], ys[i])
+        self.cell_radius2[cell] = max(self.cell_radius2.get(cell, 0.0), self.radius2[i])
+        self.update_prediction(i)
+
+    # Recompute the leave-one-out prediction of point `i`.
+    def update_prediction(self, i):
+        neighbors = self.neighbors[i]
+        correct = 0
+        if len(neighbors) > 0:
+            prediction = self.points.vote(j for _, j in neighbors)
+            code = self.points.labels[i]
+            correct = int(code != UNASSIGNED and prediction == self.points.names[code])
+        self.num_correct += correct - self.correct[i]
+        self.correct[i] = correct
@@ -0,0 +1,168 @@
+import math
+import os
+import random
+
+import kernels
+import kmeans
+import metrics
+import restarts
+
+
+# Return the matrix of distances between the sampled points. It does not
+# depend on k, so it is computed once and reused for every clustering.
+def sample_distances(points, sample):
+    xs = [points.xs[i] for i in sample]
+    ys = [points.ys[i] for i in sample]
+    return [
+        [math.sqrt(d2) for d2 in kernels.sq_euclidean_to_many(x, y, xs, ys)]
+        for x, y in zip(xs, ys)
+    ]
+
+
+# Return the mean silhouette of the sampled points given their cluster
+# labels. A point's silhouette compares its mean distance to the rest of
+# its own cluster (a) with its mean distance to the nearest other cluster
+# (b): (b - a) / max(a, b). Only distances within the sample are used, so
+# the cost is O(sample size squared) instead of O(n squared). Points that
+# are alone in their cluster score 0.
+def silhouette(distances, labels, k):
+    if len(labels) == 0:
+        return 0.0
+    sizes = [0] * k
+    for c in labels:
+        sizes[c] += 1
+
+    total = 0.0
+    for row, own in zip(distances, labels):
+        if sizes[own] < 2:
+            continue
+        sums = [0.0] * k
+        for d, c in zip(row, labels):
+            sums[c] += d
+        a = sums[own] / (sizes[own] - 1)
+        b = min(
+            (sums[c] / sizes[c] for c in range(k) if c != own and sizes[c] > 0),
+            default=a,
+        )
+        if max(a, b) > 0:
+            total += (b - a) / max(a, b)
+    return total / len(labels)
+
+
+# Cluster the shared points for each k in `ks`, in increasing order. Each
+# run after the first is warm-started from the previous k's centers plus
+# one k-means++ center. Return a (k, inertia, silhouette, iterations) row
+# for each k; the silhouette is None for k = 1.
+def score_chain(task):
+    ks, method, rng_seed, stop_distance, max_iterations, sample = task
+    points = restarts.shared_points
+    weights = restarts.shared_weights
+    rng = random.Random(rng_seed)
+    distances = sample_distances(points, sample)
+
+    rows = []
+    centers = None
+    for k in ks:
+        model = kmeans.KMeans(
+            points, k, method, rng, stop_distance, max_iterations, weights
+        )
+        if centers is None:
+            model.seed()
+        else:
+            model.seed(kmeans.extend_seeds(points, centers, k, rng, weights))
+        model.run()
+        centers = model.centers
+
+        score = None
+        if k > 1:
+            labels = [
+                kernels.nearest_sq_euclidean(points.xs[i], points.ys[i], centers)[0]
+                for i in sample
+            ]
+            score = silhouette(distances, labels, k)
+        rows.append((k, model.inertia(), score, model.iterations))
+    return rows
+
+
+# Return the k at the elbow of the inertia curve: after scaling both axes
+# to [0, 1], the point farthest below the straight line from the first
+# row to the last.
+def elbow(rows):
+    if len(rows) < 3:
+        return rows[0][0]
+    first_k, first_inertia = rows[0][0], rows[0][1]
+    last_k, last_inertia = rows[-1][0], rows[-1][1]
+    if first_inertia <= last_inertia:
+        return first_k
+
+    def depth(row):
+        x = (row[0] - first_k) / (last_k - first_k)
+        y = (row[1] - last_inertia) / (first_inertia - last_inertia)
+        return (1 - x) - y
+
+    return max(rows, key=depth)[0]
+
+
+# Cluster the points for every k from min_k to max_k and score each k by
+# its inertia and a silhouette over `sample_size` sampled points. The k
+# range is split into contiguous chains, one per process, that run in
+# parallel; within a chain each k is warm-started from the previous one.
+# Return (recommended k, elbow k, rows) where the recommendation is the k
+# with the best silhouette (the elbow if no k has one) and rows are the
+# (k, inertia, silhouette, iterations) table sorted by k. Weighted points
+# are sampled for the silhouette in proportion to their weights. max_k is
+# lowered to the number of points; the range must not be empty.
+def select_k(
+    points,
+    min_k,
+    max_k,
+    method,
+    rng,
+    sample_size=500,
+    stop_distance=1.0,
+    max_iterations=None,
+    processes=None,
+    weights=None,
+):
+    max_k = min(max_k, len(points))
+    if max_k < min_k or min_k < 1:
+        raise ValueError(f"No k to try between {min_k} and {max_k}")
+    ks = list(range(min_k, max_k + 1))
+    num_chains = min(processes or os.cpu_count() or 1, len(ks))
+    chain_size = math.ceil(len(ks) / num_chains)
+    if weights is None:
+        sample = rng.sample(range(len(points)), min(sample_size, len(points)))
+    else:
+        sample = rng.choices(range(len(points)), weights, k=sample_size)
+    tasks = [
+        (
+            ks[start : start + chain_size],
+            method,
+            rng.randrange(2**32),
+            stop_distance,
+            max_iterations,
+            sample,
+        )
+        for start in range(0, len(ks), chain_size)
+    ]
+
+    rows = []
+    with metrics.phase("k_search"):
+        chains = restarts.map_shared(points, score_chain, tasks, num_chains, weights)
+    for chain in chains:
+        rows.extend(chain)
+
+    elbow_k = elbow(rows)
+    scored = [row for row in rows if row[2] is not None]
+    if len(scored) == 0:
+        return elbow_k, elbow_k, rows
+    return max(scored, key=lambda row: row[2])[0], elbow_k, rows
+
+
+# Print a score table returned by select_k().
+def print_table(rows, best_k, elbow_k):
+    print("    k       inertia  silhouette  iterations")
+    for k, inertia, score, iterations in rows:
+        score = "" if score is None else f"{score:.3f}"
+        marks = ("  best" if k == best_k else "") + ("  elbow" if k == elbow_k else "")
+        print(f"{k:5} {inertia:13.1f} {score:>11} {iterations:11}{marks}")
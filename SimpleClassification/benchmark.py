@@ -0,0 +1,353 @@
+import argparse
+import functools
+import json
+import platform
+import random
+import sys
+import time
+
+import kmeans
+from pointset import GlyphSet, PointSet
+from spatial import GridIndex
+
+BASELINE_PATH = "resources/benchmarks/baseline.json"
+
+# Each timing is the best of this many repeats of at least MIN_TIME
+# seconds.
+REPEATS = 5
+MIN_TIME = 0.1
+
+# Queries timed per KNN case, and k-means iterations per tick case.
+NUM_QUERIES = 20
+NUM_TICKS = 5
+
+# The canvas-sized square that 2D points are scattered over, and the
+# grid cell size knn_2d uses.
+FIELD_SIZE = 300
+CELL_SIZE = 20
+
+# Number of digit classes in the generated glyph data, and the fraction of
+# each glyph's bits that differ from its class prototype.
+NUM_DIGITS = 10
+BIT_NOISE = 0.1
+
+# Iterations of the calibration loop, and how many times a case that looks
+# like a regression is measured again before it counts as one.
+CALIBRATION_LOOPS = 10_000
+RETRIES = 2
+
+
+# Return a PointSet of `n` labelled points in Gaussian blobs, one blob per
+# label, generated from `seed`. Datasets are cached so that every case of
+# the same size times the same data.
+@functools.cache
+def make_points(n, seed):
+    rng = random.Random(seed)
+    centers = [
+        (rng.uniform(0, FIELD_SIZE), rng.uniform(0, FIELD_SIZE)) for _ in range(8)
+    ]
+    points = PointSet()
+    for _ in range(n):
+        c = rng.randrange(len(centers))
+        cx, cy = centers[c]
+        points.add(rng.gauss(cx, 20), rng.gauss(cy, 20), str(c))
+    return points
+
+
+# Return a GlyphSet of `n` noisy copies of random digit prototypes with
+# `num_features` bits each, generated from `seed`.
+@functools.cache
+def make_glyphs(n, num_features, seed):
+    rng = random.Random(seed)
+    prototypes = [rng.getrandbits(num_features) for _ in range(NUM_DIGITS)]
+    glyphs = GlyphSet(num_features)
+    for _ in range(n):
+        digit = rng.randrange(NUM_DIGITS)
+        glyphs.add(str(digit), prototypes[digit] ^ noise_mask(num_features, rng))
+    return glyphs
+
+
+# Return a random mask with BIT_NOISE of its `num_features` bits set.
+def noise_mask(num_features, rng):
+    mask = 0
+    for bit in rng.sample(range(num_features), int(num_features * BIT_NOISE)):
+        mask |= 1 << bit
+    return mask
+
+
+# Return the time taken by `loops` calls to `run`. If `setup` is given it
+# is called before every call and its result is passed to `run`; it is
+# not timed.
+def timed(run, loops, setup):
+    total = 0.0
+    for _ in range(loops):
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        run(state)
+        total += time.perf_counter() - start
+    return total
+
+
+# Return the time per operation of `run`, which performs `count`
+# operations. Like timeit, the number of loops is doubled until a
+# measurement takes at least MIN_TIME, and the best of REPEATS such
+# measurements is kept, so short cases are not lost in timer noise.
+def best_time(run, count, setup=None):
+    loops = 1
+    best = timed(run, loops, setup)
+    while best < MIN_TIME:
+        loops *= 2
+        best = timed(run, loops, setup)
+    for _ in range(REPEATS - 1):
+        best = min(best, timed(run, loops, setup))
+    return best / (loops * count)
+
+
+# Time GlyphSet.predict, the knn_digits hot path, per query.
+def bench_digits_predict(n, k, num_features, seed):
+    glyphs = make_glyphs(n, num_features, seed)
+    rng = random.Random(seed + 1)
+    queries = [rng.getrandbits(num_features) for _ in range(NUM_QUERIES)]
+
+    def run(_):
+        for bits in queries:
+            glyphs.predict(bits, k)
+
+    return best_time(run, len(queries))
+
+
+# Time PointSet.knn, knn_2d's exact prediction, per query.
+def bench_points_knn(n, k, seed):
+    points = make_points(n, seed)
+    queries = make_queries(seed)
+
+    def run(_):
+        for x, y in queries:
+            points.knn(x, y, k)
+
+    return best_time(run, len(queries))
+
+
+# Time GridIndex.nearest, the grid search knn_2d uses for its accuracy
+# tracking, per query.
+def bench_grid_knn(n, k, seed):
+    points = make_points(n, seed)
+    index = GridIndex(points, CELL_SIZE)
+    queries = make_queries(seed)
+
+    def run(_):
+        for x, y in queries:
+            points.vote(i for _, i in index.nearest(x, y, k))
+
+    return best_time(run, len(queries))
+
+
+# Time a k-means tick: one Hamerly iteration, averaged over the first
+# NUM_TICKS iterations after seeding.
+def bench_kmeans_tick(n, k, seed):
+    points = make_points(n, seed)
+
+    def setup():
+        model = kmeans.KMeans(points, k, "k-means++", random.Random(seed))
+        model.seed()
+        return model
+
+    def run(model):
+        for _ in range(NUM_TICKS):
+            model.step()
+
+    return best_time(run, NUM_TICKS, setup)
+
+
+# Run a fixed pure-Python loop of float and integer arithmetic, like the
+# kernels'. Its time measures how fast this machine runs Python right now.
+def calibration_loop(_):
+    total = 0.0
+    bits = 0
+    for i in range(CALIBRATION_LOOPS):
+        d = i * 0.5 - 3.0
+        total += d * d
+        bits += (bits ^ i).bit_count()
+    return total, bits
+
+
+# Return the time of one calibration loop.
+def calibrate():
+    return best_time(calibration_loop, 1)
+
+
+# Return NUM_QUERIES random query points.
+def make_queries(seed):
+    rng = random.Random(seed + 1)
+    return [
+        (rng.uniform(0, FIELD_SIZE), rng.uniform(0, FIELD_SIZE))
+        for _ in range(NUM_QUERIES)
+    ]
+
+
+# Return the benchmark cases as (name, function) pairs, where each
+# function takes no arguments and returns seconds per operation.
+def make_cases(sizes, ks, features, seed):
+    cases = []
+    for n in sizes:
+        for k in ks:
+            for d in features:
+                cases.append(
+                    (
+                        f"digits_predict n={n} k={k} d={d}",
+                        lambda n=n, k=k, d=d: bench_digits_predict(n, k, d, seed),
+                    )
+                )
+            cases.append(
+                (
+                    f"points_knn n={n} k={k}",
+                    lambda n=n, k=k: bench_points_knn(n, k, seed),
+                )
+            )
+            cases.append(
+                (f"grid_knn n={n} k={k}", lambda n=n, k=k: bench_grid_knn(n, k, seed))
+            )
+            cases.append(
+                (
+                    f"kmeans_tick n={n} k={k}",
+                    lambda n=n, k=k: bench_kmeans_tick(n, k, seed),
+                )
+            )
+    return cases
+
+
+# Return the reasons the baseline report cannot be compared with `report`,
+# which are differences in the Python version or machine type.
+def mismatches(report, baseline):
+    return [
+        f"{key} {report[key]} differs from the baseline's {baseline[key]}"
+        for key in ("python", "machine")
+        if key in baseline and baseline[key] != report[key]
+    ]
+
+
+# Compare a report's results against a baseline report. Times are divided
+# by each report's calibration time, when both have one, so that a machine
+# that is uniformly slower or busier does not look like a regression. A
+# case that is still more than `threshold` (a fraction) slower is timed
+# again with `remeasure(name)` up to RETRIES times, keeping the best time,
+# so one noisy measurement does not fail the run. Print one line per case
+# and return the names of the cases that regressed.
+def compare(report, baseline, threshold, remeasure):
+    scale = 1.0
+    if report.get("calibration") and baseline.get("calibration"):
+        scale = baseline["calibration"] / report["calibration"]
+        print(f"Times scaled by x{scale:.2f} to the baseline machine speed")
+
+    regressions = []
+    for name, seconds in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:40} {seconds * 1e3:10.3f} ms  (no baseline)")
+            continue
+        for _ in range(RETRIES):
+            if seconds * scale / base <= 1 + threshold:
+                break
+            seconds = min(seconds, remeasure(name))
+        ratio = seconds * scale / base
+        status = ""
+        if ratio > 1 + threshold:
+            status = "  REGRESSION"
+            regressions.append(name)
+        print(
+            f"{name:40} {seconds * scale * 1e3:10.3f} ms  "
+            f"baseline {base * 1e3:10.3f} ms  x{ratio:.2f}{status}"
+        )
+    return regressions
+
+
+# Parse a comma-separated list of ints.
+def int_list(text):
+    return [int(value) for value in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time the KNN and k-means hot paths without a display."
+    )
+    parser.add_argument("--sizes", type=int_list, default=[1000, 10000, 100000])
+    parser.add_argument("--ks", type=int_list, default=[1, 5, 15])
+    parser.add_argument(
+        "--features", type=int_list, default=[48, 256], help="glyph bits"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--filter", default="", help="only run cases whose name contains this"
+    )
+    parser.add_argument("--output", metavar="FILE", help="write results as JSON")
+    parser.add_argument("--baseline", metavar="FILE", default=BASELINE_PATH)
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="merge the results into the baseline instead of comparing",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="fail if a case is this fraction slower than the baseline",
+    )
+    args = parser.parse_args()
+
+    # Calibrate before and after the cases and keep the faster, since
+    # other load can only make the loop slower.
+    cases = {
+        name: case
+        for name, case in make_cases(args.sizes, args.ks, args.features, args.seed)
+        if args.filter in name
+    }
+    calibration = calibrate()
+    results = {name: case() for name, case in cases.items()}
+    calibration = min(calibration, calibrate())
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": args.seed,
+        "calibration": calibration,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {"results": {}}
+
+    if args.update_baseline:
+        # Rescale the cases that were not run to this run's calibration.
+        old = baseline["results"]
+        if baseline.get("calibration"):
+            scale = calibration / baseline["calibration"]
+            old = {name: seconds * scale for name, seconds in old.items()}
+        merged = {**report, "results": {**old, **results}}
+        with open(args.baseline, "w") as f:
+            json.dump(merged, f, indent=2)
+        print(f"Updated {len(results)} cases in {args.baseline}")
+        return
+
+    reasons = mismatches(report, baseline)
+    for reason in reasons:
+        print(f"Warning: {reason}; skipping the comparison", file=sys.stderr)
+    if reasons:
+        baseline = {"results": {}}
+    regressions = compare(report, baseline, args.threshold, lambda name: cases[name]())
+    if regressions:
+        print(
+            f"{len(regressions)} of {len(results)} cases regressed by more "
+            f"than {round(100 * args.threshold)}%",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
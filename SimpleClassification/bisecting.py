@@ -0,0 +1,139 @@
+import math
+from array import array
+from itertools import repeat
+
+import kmeans
+from kernels import sq_euclidean
+from pointset import PointSet
+
+
+class ClusterNode:
+    # One cluster in a bisecting k-means tree. Leaves hold the indices of
+    # their points; a split node keeps its two children and the position in
+    # which it was split, so the tree can later be cut at any k.
+    def __init__(self, indices, center, sse):
+        self.indices = indices
+        self.center = center
+        self.sse = sse
+        self.children = None
+        self.split_order = None
+
+
+# Return the centroid and the sum of squared errors of the given points,
+# weighted by `weights` if it is given.
+def centroid_and_sse(xs, ys, indices, weights=None):
+    if weights is None:
+        weights = repeat(1)
+    else:
+        weights = [weights[i] for i in indices]
+    total = math.fsum(w for _, w in zip(indices, weights))
+    cx = math.fsum(w * xs[i] for i, w in zip(indices, weights)) / total
+    cy = math.fsum(w * ys[i] for i, w in zip(indices, weights)) / total
+    sse = math.fsum(
+        w * sq_euclidean(xs[i], ys[i], cx, cy) for i, w in zip(indices, weights)
+    )
+    return (cx, cy), sse
+
+
+class BisectingKMeans:
+    # Bisecting k-means. Starting with all points in one cluster, the leaf
+    # with the largest SSE is split in two with 2-means until there are
+    # `max_k` leaves. Each split only touches that cluster's points, so
+    # building the tree costs about O(n log k), and assigning a point walks
+    # down the tree comparing two centers per level instead of k. Points
+    # may be weighted, as in a coreset.
+    def __init__(
+        self, points, max_k, rng, stop_distance=1.0, max_iterations=None, weights=None
+    ):
+        self.points = points
+        self.weights = weights
+        self.rng = rng
+        self.stop_distance = stop_distance
+        self.max_iterations = max_iterations
+
+        indices = array("i", range(len(points)))
+        center, sse = centroid_and_sse(points.xs, points.ys, indices, weights)
+        self.root = ClusterNode(indices, center, sse)
+        self.leaves = [self.root]
+        self.num_splits = 0
+        self.iterations = 0
+        while len(self.leaves) < max_k and self.split_worst():
+            pass
+
+    # Split the leaf with the largest SSE. Return False if no leaf can be
+    # split any further.
+    def split_worst(self):
+        candidates = [leaf for leaf in self.leaves if leaf.sse > 0]
+        if len(candidates) == 0:
+            return False
+        node = max(candidates, key=lambda leaf: leaf.sse)
+
+        # Run 2-means on just this cluster's points.
+        xs, ys = self.points.xs, self.points.ys
+        subset = PointSet()
+        subset.xs = array("d", (xs[i] for i in node.indices))
+        subset.ys = array("d", (ys[i] for i in node.indices))
+        subset.clear_assignments()
+        weights = None
+        if self.weights is not None:
+            weights = array("d", (self.weights[i] for i in node.indices))
+        model = kmeans.KMeans(
+            subset,
+            2,
+            "k-means++",
+            self.rng,
+            self.stop_distance,
+            self.max_iterations,
+            weights,
+        ).run()
+        self.iterations += model.iterations
+
+        halves = (array("i"), array("i"))
+        for i, side in zip(node.indices, subset.assignments):
+            halves[side].append(i)
+        if len(halves[0]) == 0 or len(halves[1]) == 0:
+            # Identical points cannot be split.
+            node.sse = 0.0
+            return True
+
+        node.children = [
+            ClusterNode(half, *centroid_and_sse(xs, ys, half, self.weights))
+            for half in halves
+        ]
+        node.split_order = self.num_splits
+        node.indices = None
+        self.num_splits += 1
+        self.leaves.remove(node)
+        self.leaves.extend(node.children)
+        return True
+
+    # Return the leaves of the tree cut after its first k - 1 splits, in
+    # a stable order. This gives a clustering for any k up to max_k.
+    def cut(self, k):
+        leaves = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node.children is None or node.split_order >= k - 1:
+                leaves.append(node)
+            else:
+                stack.extend(reversed(node.children))
+        return leaves
+
+    # Assign every point to one of the leaves of the tree cut at k by
+    # walking down from the root, and return the leaves' centers. At each
+    # split the point follows the nearer child.
+    def assign(self, k):
+        leaves = self.cut(k)
+        leaf_ids = {id(leaf): c for c, leaf in enumerate(leaves)}
+        assignments = self.points.assignments
+        for i, (x, y) in enumerate(zip(self.points.xs, self.points.ys)):
+            node = self.root
+            while id(node) not in leaf_ids:
+                (ax, ay), (bx, by) = node.children[0].center, node.children[1].center
+                if sq_euclidean(x, y, ax, ay) <= sq_euclidean(x, y, bx, by):
+                    node = node.children[0]
+                else:
+                    node = node.children[1]
+            assignments[i] = leaf_ids[id(node)]
+        return [leaf.center for leaf in leaves]
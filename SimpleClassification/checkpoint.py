@@ -0,0 +1,117 @@
+import json
+import os
+import struct
+import time
+import zlib
+from array import array
+
+# Checkpoint files hold a header, the engine's small state as JSON, then
+# the per-point upper and lower bounds as float64 and the assignments as
+# int32, padded so the arrays start on an 8-byte boundary.
+MAGIC = b"KMC1"
+HEADER = struct.Struct("<4sI4xQ")
+
+
+# Return a checksum of the points' coordinates and weights, so a
+# checkpoint is not resumed against different data.
+def fingerprint(points, weights=None):
+    checksum = zlib.crc32(memoryview(points.xs).cast("B"))
+    checksum = zlib.crc32(memoryview(points.ys).cast("B"), checksum)
+    if weights is not None:
+        checksum = zlib.crc32(memoryview(weights).cast("B"), checksum)
+    return checksum
+
+
+# Write the state of a kmeans.KMeans engine to `path`: centers,
+# assignments, Hamerly bounds, iteration count and RNG state. The file is
+# replaced atomically, so a crash while saving leaves the previous
+# checkpoint intact.
+def save(path, model):
+    engine = model.engine
+    count = len(model.points)
+    state = {
+        "k": model.k,
+        "method": model.method,
+        "fingerprint": fingerprint(model.points, model.weights),
+        "iterations": model.iterations,
+        "shift": model.shift,
+        "centers": model.centers,
+        "bound_centers": engine.bound_centers,
+        "skipped_fraction": engine.skipped_fraction,
+        "rng": model.rng.getstate(),
+    }
+    state = json.dumps(state).encode("utf-8")
+    padding = b"\0" * (-(HEADER.size + len(state)) % 8)
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(state), count) + state + padding)
+        f.write(memoryview(engine.upper).cast("B"))
+        f.write(memoryview(engine.lower).cast("B"))
+        f.write(memoryview(model.points.assignments).cast("B"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+# Restore a kmeans.KMeans engine from a checkpoint written by save(). The
+# engine must have been made for the same points, weights and k. Stepping
+# it afterwards gives exactly the iterations an uninterrupted run would.
+def restore(path, model):
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, state_length, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"Not a checkpoint file: {path}")
+    offset = HEADER.size
+    state = json.loads(data[offset : offset + state_length])
+    offset += state_length
+    offset += -offset % 8
+
+    if count != len(model.points):
+        raise ValueError(f"Checkpoint is for {count} points, not {len(model.points)}")
+    if state["fingerprint"] != fingerprint(model.points, model.weights):
+        raise ValueError("Checkpoint was made for different points")
+    if state["k"] != model.k:
+        raise ValueError(f"Checkpoint is for k = {state['k']}, not {model.k}")
+
+    engine = model.engine
+    engine.upper = array("d", data[offset : offset + 8 * count])
+    offset += 8 * count
+    engine.lower = array("d", data[offset : offset + 8 * count])
+    offset += 8 * count
+    model.points.assignments = array("i", data[offset : offset + 4 * count])
+    engine.bound_centers = [tuple(center) for center in state["bound_centers"]]
+    engine.skipped_fraction = state["skipped_fraction"]
+
+    model.method = state["method"]
+    model.centers = [tuple(center) for center in state["centers"]]
+    model.iterations = state["iterations"]
+    model.shift = state["shift"]
+    version, internal, gauss_next = state["rng"]
+    model.rng.setstate((version, tuple(internal), gauss_next))
+
+
+class Checkpointer:
+    # Save a checkpoint every `every` iterations, every `seconds` seconds,
+    # or both, whichever comes first, and when the engine is done. Call
+    # update() after each iteration.
+    def __init__(self, path, every=None, seconds=None):
+        self.path = path
+        self.every = every
+        self.seconds = seconds
+        self.last_time = time.monotonic()
+        self.num_saved = 0
+
+    # Save the engine's state if a checkpoint is due.
+    def update(self, model):
+        now = time.monotonic()
+        due = model.done()
+        if self.every is not None and model.iterations % self.every == 0:
+            due = True
+        if self.seconds is not None and now - self.last_time >= self.seconds:
+            due = True
+        if due:
+            save(self.path, model)
+            self.last_time = now
+            self.num_saved += 1
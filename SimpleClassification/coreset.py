@@ -0,0 +1,76 @@
+import math
+from array import array
+
+from kernels import sq_euclidean
+from pointset import PointSet
+
+
+class Coreset:
+    # A weighted summary of a PointSet for clustering. Points that fall in
+    # the same grid cell are replaced by their centroid, weighted by how
+    # many points it stands for. With cell_size 0 only exact duplicates
+    # are merged. k-means then runs on the summary, whose size depends on
+    # the spread of the data rather than on the number of points.
+    #
+    # Because each representative is the centroid of its members, giving
+    # every member its representative's cluster has an inertia of exactly
+    # the weighted inertia plus `scatter`, the squared distance of the
+    # points to their representatives. And for any set of centers, the
+    # square roots of the full and weighted inertias differ by at most
+    # sqrt(scatter).
+    def __init__(self, points, cell_size=0):
+        self.source = points
+        self.cell_size = cell_size
+        self.points = PointSet()
+        self.weights = array("d")
+        self.owner = array("i", bytes(4 * len(points)))
+
+        # Group the points by cell and add up their coordinates.
+        xs, ys = points.xs, points.ys
+        cells = {}
+        sum_xs, sum_ys = [], []
+        for i, (x, y) in enumerate(zip(xs, ys)):
+            if cell_size > 0:
+                key = (math.floor(x / cell_size), math.floor(y / cell_size))
+            else:
+                key = (x, y)
+            r = cells.get(key)
+            if r is None:
+                r = cells[key] = len(sum_xs)
+                sum_xs.append(0.0)
+                sum_ys.append(0.0)
+                self.weights.append(0.0)
+            sum_xs[r] += x
+            sum_ys[r] += y
+            self.weights[r] += 1
+            self.owner[i] = r
+
+        for sum_x, sum_y, weight in zip(sum_xs, sum_ys, self.weights):
+            self.points.xs.append(sum_x / weight)
+            self.points.ys.append(sum_y / weight)
+        self.points.clear_assignments()
+
+        reps_x, reps_y = self.points.xs, self.points.ys
+        self.scatter = math.fsum(
+            sq_euclidean(x, y, reps_x[r], reps_y[r])
+            for x, y, r in zip(xs, ys, self.owner)
+        )
+
+    def __len__(self):
+        return len(self.points)
+
+    # Give every original point its representative's assignment.
+    def expand(self):
+        source = self.source.assignments
+        assignments = self.points.assignments
+        for i, r in enumerate(self.owner):
+            source[i] = assignments[r]
+
+    # Return the (low, high) range that the inertia of the original points
+    # around the same centers must lie in, given the weighted inertia with
+    # every representative assigned to its nearest center. The high end is
+    # reached when every point keeps its representative's cluster, as after
+    # expand().
+    def inertia_bounds(self, weighted_inertia):
+        low = max(math.sqrt(weighted_inertia) - math.sqrt(self.scatter), 0.0)
+        return low * low, weighted_inertia + self.scatter
@@ -0,0 +1,291 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from pointset import UNASSIGNED, GlyphSet, PointSet
+
+# Named 2D datasets live in this directory, either as text files with one
+# "x y [label]" line per point or as binary .pts files. Parsed text files
+# are cached in binary form in the CACHE_SUBDIR subdirectory.
+DATASET_DIR = "resources/datasets"
+CACHE_SUBDIR = "cache"
+TEXT_SUFFIX = ".txt"
+BINARY_SUFFIX = ".pts"
+
+# Binary layout: header, label names as JSON, padding to 8 bytes, then the
+# x array, the y array and (if present) the label code array. The source
+# size and mtime tell whether a cache file is still valid; files written
+# directly as .pts have zeros there.
+MAGIC = b"PTS1"
+HEADER = struct.Struct("<4sB3xQQqI4x")
+
+# Binary glyph files start with a header holding the grid's rows and
+# columns, the number of glyphs and the length of the label names, which
+# follow as JSON padded to 8 bytes. Each glyph is then one byte of label
+# code followed by its bits, packed big-endian into whole bytes.
+GLYPH_SUFFIX = ".gly"
+GLYPH_MAGIC = b"GLY1"
+GLYPH_HEADER = struct.Struct("<4sHHQI4x")
+
+
+# Return the names of all registered datasets, sorted.
+def list_datasets(directory=DATASET_DIR):
+    names = set()
+    if os.path.isdir(directory):
+        for file_name in os.listdir(directory):
+            base, suffix = os.path.splitext(file_name)
+            if suffix in (TEXT_SUFFIX, BINARY_SUFFIX):
+                names.add(base)
+    return sorted(names)
+
+
+# Return the file that holds a named dataset, preferring the binary form.
+def dataset_path(name, directory=DATASET_DIR):
+    for suffix in (BINARY_SUFFIX, TEXT_SUFFIX):
+        path = os.path.join(directory, name + suffix)
+        if os.path.exists(path):
+            return path
+    raise KeyError(f"Unknown dataset: {name}")
+
+
+# Load a named dataset into a PointSet. If `labels` is False the label
+# column is skipped and every point is unlabelled.
+def load_dataset(name, labels=True, directory=DATASET_DIR):
+    path = dataset_path(name, directory)
+    if path.endswith(BINARY_SUFFIX):
+        return read_binary(path, labels)
+
+    # Use the cached arrays if they are still up to date.
+    stat = os.stat(path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    cache_path = os.path.join(directory, CACHE_SUBDIR, name + BINARY_SUFFIX)
+    if os.path.exists(cache_path) and read_stamp(cache_path) == stamp:
+        return read_binary(cache_path, labels)
+
+    # Parse the text file and cache the result.
+    with open(path, "r") as f:
+        points = parse_points(f.read())
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    write_binary(cache_path, points, stamp)
+    if not labels:
+        remove_labels(points)
+    return points
+
+
+# Load a dataset given either its registered name or the path of a .txt
+# or .pts file. A path is loaded as named, in the format of its suffix,
+# and is not cached.
+def load_path(path, labels=True):
+    if path.endswith(BINARY_SUFFIX):
+        return read_binary(path, labels)
+    if not path.endswith(TEXT_SUFFIX):
+        return load_dataset(path, labels)
+    with open(path, "r") as f:
+        points = parse_points(f.read())
+    if not labels:
+        remove_labels(points)
+    return points
+
+
+# Make every point of a PointSet unlabelled.
+def remove_labels(points):
+    points.labels = array("i", [UNASSIGNED]) * len(points)
+    points.names = []
+    points.codes = {}
+
+
+# Parse text with one "x y [label]" line per point. All lines must have the
+# same number of columns.
+def parse_points(text):
+    points = PointSet()
+    fields = text.split()
+    if len(fields) == 0:
+        return points
+
+    num_columns = len(text.lstrip().split("\n", 1)[0].split())
+    count = len(fields) // num_columns
+    if num_columns not in (2, 3) or len(fields) != num_columns * count:
+        raise ValueError("Dataset lines must all be 'x y' or 'x y label'")
+
+    points.xs = array("d", map(float, fields[0::num_columns]))
+    points.ys = array("d", map(float, fields[1::num_columns]))
+    if num_columns == 3:
+        points.labels = array("i", map(points.label_code, fields[2::3]))
+    else:
+        points.labels = array("i", [UNASSIGNED]) * count
+    points.clear_assignments()
+    return points
+
+
+# Write a PointSet in the binary format.
+def write_binary(path, points, stamp=(0, 0)):
+    chunks = [(points.xs, points.ys, points.labels)]
+    write_binary_chunks(path, len(points), points.names, chunks, stamp)
+
+
+# Write `count` points in the binary format from an iterable of
+# (xs, ys, labels) array chunks, so that only one chunk has to be in
+# memory. Each chunk is written into its place in the x, y and label
+# columns. Labels are only written if there are label names.
+def write_binary_chunks(path, count, names, chunks, stamp=(0, 0)):
+    has_labels = len(names) > 0
+    names = json.dumps(names).encode("utf-8")
+    padding = b"\0" * (-(HEADER.size + len(names)) % 8)
+    header = HEADER.pack(MAGIC, has_labels, count, *stamp, len(names))
+    base = len(header) + len(names) + len(padding)
+
+    # Write to a temporary file first so readers never see a partial file.
+    temp_path = path + ".tmp"
+    written = 0
+    with open(temp_path, "wb") as f:
+        f.write(header + names + padding)
+        f.truncate(base + (20 if has_labels else 16) * count)
+        for xs, ys, labels in chunks:
+            f.seek(base + 8 * written)
+            f.write(memoryview(xs).cast("B"))
+            f.seek(base + 8 * (count + written))
+            f.write(memoryview(ys).cast("B"))
+            if has_labels:
+                f.seek(base + 16 * count + 4 * written)
+                f.write(memoryview(labels).cast("B"))
+            written += len(xs)
+    if written != count:
+        os.remove(temp_path)
+        raise ValueError(f"Expected {count} points, got {written}")
+    os.replace(temp_path, path)
+
+
+# Write `count` glyphs of rows x cols bits in the binary glyph format from
+# an iterable of chunks, each a list of (label code, bits) pairs.
+def write_glyph_chunks(path, rows, cols, count, names, chunks):
+    names = json.dumps(names).encode("utf-8")
+    padding = b"\0" * (-(GLYPH_HEADER.size + len(names)) % 8)
+    header = GLYPH_HEADER.pack(GLYPH_MAGIC, rows, cols, count, len(names))
+    num_bytes = (rows * cols + 7) // 8
+
+    temp_path = path + ".tmp"
+    written = 0
+    with open(temp_path, "wb") as f:
+        f.write(header + names + padding)
+        for chunk in chunks:
+            f.write(
+                b"".join(
+                    bytes((code,)) + bits.to_bytes(num_bytes, "big")
+                    for code, bits in chunk
+                )
+            )
+            written += len(chunk)
+    if written != count:
+        os.remove(temp_path)
+        raise ValueError(f"Expected {count} glyphs, got {written}")
+    os.replace(temp_path, path)
+
+
+# Read a binary glyph file into a GlyphSet.
+def read_glyphs(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, rows, cols, count, names_length = GLYPH_HEADER.unpack_from(data)
+    if magic != GLYPH_MAGIC:
+        raise ValueError(f"Not a glyph file: {path}")
+    offset = GLYPH_HEADER.size
+    names = json.loads(data[offset : offset + names_length])
+    offset += names_length
+    offset += -offset % 8
+
+    glyphs = GlyphSet(rows * cols)
+    record_size = 1 + (rows * cols + 7) // 8
+    for start in range(offset, offset + count * record_size, record_size):
+        bits = int.from_bytes(data[start + 1 : start + record_size], "big")
+        glyphs.add(names[data[start]], bits)
+    return glyphs
+
+
+# Return the (size, mtime) source stamp stored in a binary file.
+def read_stamp(path):
+    with open(path, "rb") as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    magic, _, _, size, mtime, _ = HEADER.unpack(header)
+    if magic != MAGIC:
+        return None
+    return (size, mtime)
+
+
+# Memory-map a binary file. Return the mapped bytes, whether the file has
+# labels, the number of points, the label names and the offset of the x
+# array.
+def map_binary(path):
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(data)
+
+    magic, has_labels, count, _, _, names_length = HEADER.unpack(view[: HEADER.size])
+    if magic != MAGIC:
+        raise ValueError(f"Not a point file: {path}")
+    offset = HEADER.size
+    names = json.loads(bytes(view[offset : offset + names_length]))
+    offset += names_length
+    offset += -offset % 8
+    return view, has_labels, count, names, offset
+
+
+# Memory-map a binary file and return a PointSet whose coordinate (and
+# label) arrays are read-only views on the file.
+def read_binary(path, labels=True):
+    view, has_labels, count, names, offset = map_binary(path)
+    points = PointSet()
+    points.xs = view[offset : offset + 8 * count].cast("d")
+    offset += 8 * count
+    points.ys = view[offset : offset + 8 * count].cast("d")
+    offset += 8 * count
+    if has_labels and labels:
+        points.labels = view[offset : offset + 4 * count].cast("i")
+        points.names = names
+        points.codes = {name: code for code, name in enumerate(names)}
+    else:
+        points.labels = array("i", [UNASSIGNED]) * count
+    points.clear_assignments()
+    return points
+
+
+# Yield the points of a dataset file as lists of at most `batch_size`
+# (x, y) tuples. Only one batch is held in memory at a time, so this works
+# for files of any size. A path of "-" reads text from standard input.
+def stream_batches(path, batch_size):
+    if path.endswith(BINARY_SUFFIX):
+        yield from stream_binary_batches(path, batch_size)
+    elif path == "-":
+        yield from stream_text_batches(sys.stdin, batch_size)
+    else:
+        with open(path, "r") as f:
+            yield from stream_text_batches(f, batch_size)
+
+
+# Yield batches of (x, y) tuples from lines of "x y [label]" text.
+def stream_text_batches(lines, batch_size):
+    batch = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) == 0:
+            continue
+        batch.append((float(fields[0]), float(fields[1])))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+
+# Yield batches of (x, y) tuples from a memory-mapped binary file.
+def stream_binary_batches(path, batch_size):
+    view, _, count, _, offset = map_binary(path)
+    xs = view[offset : offset + 8 * count].cast("d")
+    ys = view[offset + 8 * count : offset + 16 * count].cast("d")
+    for start in range(0, count, batch_size):
+        end = min(start + batch_size, count)
+        yield list(zip(xs[start:end], ys[start:end]))
@@ -0,0 +1,191 @@
+import argparse
+import math
+import random
+from array import array
+
+import datasets
+from pointset import GlyphSet
+
+# The digit glyphs that noisy variants are made from, and their grid.
+DIGIT_DATA = "resources/digit_data.txt"
+DIGIT_ROWS = 8
+DIGIT_COLS = 6
+
+# The area that blob centers are placed in, matching the apps' canvases.
+FIELD_WID = 300
+FIELD_HGT = 290
+
+# Rows generated and written at a time. Memory use depends on this, not on
+# the number of rows.
+CHUNK_SIZE = 100_000
+
+
+# Return `num_clusters` random blob centers, kept away from the edges of
+# the field by the blobs' spread.
+def blob_centers(num_clusters, spread, rng):
+    margin_x = min(2 * spread, FIELD_WID / 4)
+    margin_y = min(2 * spread, FIELD_HGT / 4)
+    return [
+        (
+            rng.uniform(margin_x, FIELD_WID - margin_x),
+            rng.uniform(margin_y, FIELD_HGT - margin_y),
+        )
+        for _ in range(num_clusters)
+    ]
+
+
+# Yield chunks of (xs, ys, labels) arrays for `count` points. Each point
+# picks a blob at random and is drawn from a Gaussian around its center.
+# Coordinates are rounded to two decimals so the text and binary outputs
+# hold the same values.
+def blob_chunks(count, centers, spread, rng, chunk_size):
+    for start in range(0, count, chunk_size):
+        size = min(chunk_size, count - start)
+        xs = array("d")
+        ys = array("d")
+        labels = array("i")
+        for _ in range(size):
+            c = rng.randrange(len(centers))
+            cx, cy = centers[c]
+            xs.append(round(rng.gauss(cx, spread), 2))
+            ys.append(round(rng.gauss(cy, spread), 2))
+            labels.append(c)
+        yield xs, ys, labels
+
+
+# Write `count` labelled points in Gaussian blobs to `path`, as binary if
+# it ends in .pts and as "x y label" text otherwise.
+def write_blobs(path, count, num_clusters, spread, seed, chunk_size=CHUNK_SIZE):
+    rng = random.Random(seed)
+    names = [str(c) for c in range(num_clusters)]
+    centers = blob_centers(num_clusters, spread, rng)
+    chunks = blob_chunks(count, centers, spread, rng, chunk_size)
+    if path.endswith(datasets.BINARY_SUFFIX):
+        datasets.write_binary_chunks(path, count, names, chunks)
+        return
+    with open(path, "w") as f:
+        for xs, ys, labels in chunks:
+            f.write(
+                "".join(
+                    f"{x} {y} {names[label]}\n" for x, y, label in zip(xs, ys, labels)
+                )
+            )
+
+
+# Return the digit glyphs scaled to rows x cols cells as (label code,
+# bits) pairs, and the label names. Each target cell copies the source
+# cell it falls in.
+def load_prototypes(rows, cols):
+    with open(DIGIT_DATA, "r") as f:
+        source = GlyphSet.from_lines(f)
+    num_source_bits = DIGIT_ROWS * DIGIT_COLS
+    prototypes = []
+    for bits, code in zip(source.bits, source.labels):
+        scaled = 0
+        for r in range(rows):
+            for c in range(cols):
+                cell = (r * DIGIT_ROWS // rows) * DIGIT_COLS + c * DIGIT_COLS // cols
+                bit = (bits >> (num_source_bits - 1 - cell)) & 1
+                scaled = (scaled << 1) | bit
+        prototypes.append((code, scaled))
+    return prototypes, source.names
+
+
+# Return a mask of `num_bits` bits, each set with probability `noise`.
+# Instead of one random number per bit, the gaps between set bits are
+# drawn from a geometric distribution, so the cost is proportional to the
+# number of flipped bits.
+def flip_mask(num_bits, noise, rng):
+    if noise <= 0:
+        return 0
+    if noise >= 1:
+        return (1 << num_bits) - 1
+    log_keep = math.log(1 - noise)
+    mask = 0
+    position = -1
+    while True:
+        position += 1 + int(math.log(1 - rng.random()) / log_keep)
+        if position >= num_bits:
+            return mask
+        mask |= 1 << position
+
+
+# Yield chunks of (label code, bits) pairs: random prototypes with each bit
+# flipped with probability `noise`.
+def glyph_chunks(count, prototypes, num_bits, noise, rng, chunk_size):
+    for start in range(0, count, chunk_size):
+        size = min(chunk_size, count - start)
+        chunk = []
+        for _ in range(size):
+            code, bits = prototypes[rng.randrange(len(prototypes))]
+            chunk.append((code, bits ^ flip_mask(num_bits, noise, rng)))
+        yield chunk
+
+
+# Write `count` noisy digit glyphs of rows x cols cells to `path`, as
+# binary if it ends in .gly and in the digit_data text format otherwise.
+def write_glyphs(path, count, rows, cols, noise, seed, chunk_size=CHUNK_SIZE):
+    rng = random.Random(seed)
+    prototypes, names = load_prototypes(rows, cols)
+    num_bits = rows * cols
+    chunks = glyph_chunks(count, prototypes, num_bits, noise, rng, chunk_size)
+    if path.endswith(datasets.GLYPH_SUFFIX):
+        datasets.write_glyph_chunks(path, rows, cols, count, names, chunks)
+        return
+    with open(path, "w") as f:
+        for chunk in chunks:
+            f.write(
+                "".join(f"{names[code]}: {bits:0{num_bits}b}\n" for code, bits in chunk)
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate large synthetic datasets, streamed to disk in chunks."
+    )
+    subparsers = parser.add_subparsers(dest="kind", required=True)
+
+    blobs = subparsers.add_parser("blobs", help="labelled 2D Gaussian blobs")
+    blobs.add_argument("output", help=".pts for binary, anything else for text")
+    blobs.add_argument("-n", "--count", type=int, default=10_000)
+    blobs.add_argument("--clusters", type=int, default=5)
+    blobs.add_argument("--spread", type=float, default=15.0)
+
+    glyphs = subparsers.add_parser("glyphs", help="noisy digit glyphs")
+    glyphs.add_argument("output", help=".gly for binary, anything else for text")
+    glyphs.add_argument("-n", "--count", type=int, default=10_000)
+    glyphs.add_argument("--rows", type=int, default=DIGIT_ROWS)
+    glyphs.add_argument("--cols", type=int, default=DIGIT_COLS)
+    glyphs.add_argument(
+        "--noise", type=float, default=0.05, help="chance of flipping each bit"
+    )
+
+    for subparser in (blobs, glyphs):
+        subparser.add_argument("--seed", type=int, default=0)
+        subparser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if args.kind == "blobs":
+        write_blobs(
+            args.output,
+            args.count,
+            args.clusters,
+            args.spread,
+            args.seed,
+            args.chunk_size,
+        )
+    else:
+        write_glyphs(
+            args.output,
+            args.count,
+            args.rows,
+            args.cols,
+            args.noise,
+            args.seed,
+            args.chunk_size,
+        )
+    print(f"Wrote {args.count} {args.kind} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
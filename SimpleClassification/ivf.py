@@ -0,0 +1,325 @@
+import argparse
+import heapq
+import random
+import time
+from array import array
+
+import datasets
+import kernels
+import kmeans
+import kmodes
+import metrics
+import profiling
+from generate import flip_mask
+from pointset import GlyphSet, PointSet
+
+# References clustered to train the index. The rest are only assigned to
+# the trained centroids, so building stays fast on large reference sets.
+TRAIN_SIZE = 20_000
+
+
+# Return `count` indices sampled from range(n) without replacement, in
+# increasing order, or all of them if there are no more than `count`.
+def training_sample(n, count, rng):
+    if n <= count:
+        return range(n)
+    return sorted(rng.sample(range(n), count))
+
+
+# Return the k (distance, index) candidates with the smallest distances,
+# nearest first. Ties go to the lower index, like a brute-force search.
+def best_candidates(candidates, k):
+    return heapq.nsmallest(k, candidates)
+
+
+class PointIVF:
+    # An inverted-file KNN index over the points of a PointSet. The points
+    # are clustered with k-means into `num_lists` cells, and each point is
+    # stored in the list of its nearest centroid, with its coordinates and
+    # squared norm copied next to it so a list is scanned in one batch. A
+    # query scans only the `nprobe` lists whose centroids are nearest, so
+    # neighbors that fell into other cells can be missed; recall() measures
+    # how often. If the probed lists hold fewer than k points, the query
+    # falls back to an exact search.
+    def __init__(self, points, num_lists, rng=None, method="k-means++"):
+        self.points = points
+        rng = rng or random.Random()
+        num_lists = max(1, min(num_lists, len(points)))
+
+        # Train on a sample in its own PointSet, so the references'
+        # assignments are left alone.
+        sample = training_sample(len(points), TRAIN_SIZE, rng)
+        training = PointSet()
+        training.xs = array("d", (points.xs[i] for i in sample))
+        training.ys = array("d", (points.ys[i] for i in sample))
+        training.clear_assignments()
+        model = kmeans.KMeans(training, num_lists, method, rng).run()
+        self.centers = model.centers
+        self.center_xs = array("d", (x for x, _ in self.centers))
+        self.center_ys = array("d", (y for _, y in self.centers))
+
+        # Fill the lists.
+        self.indices = [array("i") for _ in self.centers]
+        for i, (x, y) in enumerate(zip(points.xs, points.ys)):
+            c, _ = kernels.nearest_sq_euclidean(x, y, self.centers)
+            self.indices[c].append(i)
+        metrics.count("distances", len(points) * len(self.centers))
+        norms = points.sq_norms()
+        self.list_xs = [array("d", (points.xs[i] for i in ids)) for ids in self.indices]
+        self.list_ys = [array("d", (points.ys[i] for i in ids)) for ids in self.indices]
+        self.list_norms = [array("d", (norms[i] for i in ids)) for ids in self.indices]
+
+    # Return the indices of the lists to scan for a query at (x, y).
+    def probe(self, x, y, nprobe):
+        distances = kernels.sq_euclidean_to_many(x, y, self.center_xs, self.center_ys)
+        metrics.count("distances", len(distances))
+        return heapq.nsmallest(nprobe, range(len(distances)), key=distances.__getitem__)
+
+    # Return the indices of (about) the k points nearest to (x, y), nearest
+    # first, and the number of points scanned.
+    def nearest(self, x, y, k, nprobe):
+        candidates = []
+        for c in self.probe(x, y, nprobe):
+            distances = kernels.sq_euclidean_to_many(
+                x, y, self.list_xs[c], self.list_ys[c], self.list_norms[c]
+            )
+            candidates.extend(zip(distances, self.indices[c]))
+        metrics.count("distances", len(candidates))
+        if len(candidates) < min(k, len(self.points)):
+            return self.points.nearest(x, y, k), len(self.points)
+        return [i for _, i in best_candidates(candidates, k)], len(candidates)
+
+    # Use K nearest neighbors among the probed lists to predict the name of
+    # a point at (x, y).
+    def knn(self, x, y, k, nprobe):
+        indices, _ = self.nearest(x, y, k, nprobe)
+        return self.points.vote(indices)
+
+    # Return the exact k nearest neighbors and prediction for (x, y).
+    def exact(self, x, y, k):
+        indices = self.points.nearest(x, y, k)
+        return indices, self.points.vote(indices)
+
+
+class GlyphIVF:
+    # An inverted-file KNN index over a GlyphSet, like PointIVF but in
+    # Hamming space: the glyphs are clustered with k-modes, whose centers
+    # are the bitwise majority of their cells.
+    def __init__(self, glyphs, num_lists, rng=None, method="k-means++"):
+        self.glyphs = glyphs
+        rng = rng or random.Random()
+        num_lists = max(1, min(num_lists, len(glyphs)))
+
+        sample = training_sample(len(glyphs), TRAIN_SIZE, rng)
+        training = GlyphSet(glyphs.num_features)
+        for i in sample:
+            training.bits.append(glyphs.bits[i])
+        model = kmodes.KModes(training, num_lists, method, rng).run()
+        self.centers = model.centers
+
+        self.indices = [array("i") for _ in self.centers]
+        for i, bits in enumerate(glyphs.bits):
+            c, _ = kernels.nearest_hamming(bits, self.centers)
+            self.indices[c].append(i)
+        metrics.count("distances", len(glyphs) * len(self.centers))
+        self.list_bits = [[glyphs.bits[i] for i in ids] for ids in self.indices]
+
+    # Return the indices of the lists to scan for a query glyph.
+    def probe(self, bits, nprobe):
+        distances = kernels.hamming_to_many(bits, self.centers)
+        metrics.count("distances", len(distances))
+        return heapq.nsmallest(nprobe, range(len(distances)), key=distances.__getitem__)
+
+    # Return the indices of (about) the k glyphs nearest to `bits`, nearest
+    # first, and the number of glyphs scanned.
+    def nearest(self, bits, k, nprobe):
+        candidates = []
+        for c in self.probe(bits, nprobe):
+            distances = kernels.hamming_to_many(bits, self.list_bits[c])
+            candidates.extend(zip(distances, self.indices[c]))
+        metrics.count("distances", len(candidates))
+        if len(candidates) < min(k, len(self.glyphs)):
+            return self.glyphs.nearest(bits, k), len(self.glyphs)
+        return [i for _, i in best_candidates(candidates, k)], len(candidates)
+
+    # Use K nearest neighbors among the probed lists to predict the name of
+    # a glyph.
+    def predict(self, bits, k, nprobe):
+        indices, _ = self.nearest(bits, k, nprobe)
+        return self.glyphs.vote(indices)
+
+    # Return the exact k nearest neighbors and prediction for a glyph.
+    def exact(self, bits, k):
+        indices = self.glyphs.nearest(bits, k)
+        return indices, self.glyphs.vote(indices)
+
+
+# Compare the index against brute force on the queries, which are (x, y)
+# pairs for a PointIVF and packed glyphs for a GlyphIVF. Return (recall,
+# agreement, scanned, seconds, exact_seconds): the mean fraction of the
+# true k nearest neighbors found, the fraction of queries with the same
+# prediction, the mean fraction of the references scanned, and the mean
+# seconds per query with the index and by brute force. Neighbors at the
+# same distance as the true kth one count as found.
+def recall(index, queries, k, nprobe):
+    if isinstance(index, PointIVF):
+        references = index.points
+
+        def search(query):
+            return index.nearest(*query, k, nprobe)
+
+        def exact(query):
+            return index.exact(*query, k)
+
+        def distance(query, i):
+            return kernels.sq_euclidean(*query, references.xs[i], references.ys[i])
+
+    else:
+        references = index.glyphs
+
+        def search(query):
+            return index.nearest(query, k, nprobe)
+
+        def exact(query):
+            return index.exact(query, k)
+
+        def distance(query, i):
+            return kernels.hamming(query, references.bits[i])
+
+    found = 0.0
+    agree = 0
+    scanned = 0
+    seconds = 0.0
+    exact_seconds = 0.0
+    for query in queries:
+        start = time.perf_counter()
+        indices, num_scanned = search(query)
+        prediction = references.vote(indices)
+        middle = time.perf_counter()
+        exact_indices, exact_prediction = exact(query)
+        exact_seconds += time.perf_counter() - middle
+        seconds += middle - start
+
+        if exact_indices:
+            kth = distance(query, exact_indices[-1])
+            hits = sum(1 for i in indices if distance(query, i) <= kth)
+            found += min(hits, len(exact_indices)) / len(exact_indices)
+        else:
+            found += 1
+        agree += prediction == exact_prediction
+        scanned += num_scanned
+
+    num_queries = max(len(queries), 1)
+    return (
+        found / num_queries,
+        agree / num_queries,
+        scanned / num_queries / max(len(references), 1),
+        seconds / num_queries,
+        exact_seconds / num_queries,
+    )
+
+
+# Return random query points spread over the points' bounding box.
+def point_queries(points, count, rng):
+    min_x, max_x = min(points.xs), max(points.xs)
+    min_y, max_y = min(points.ys), max(points.ys)
+    return [
+        (rng.uniform(min_x, max_x), rng.uniform(min_y, max_y)) for _ in range(count)
+    ]
+
+
+# Return noisy copies of random glyphs as queries: each bit is flipped
+# with probability `noise`.
+def glyph_queries(glyphs, count, noise, rng):
+    return [
+        glyphs.bits[rng.randrange(len(glyphs))]
+        ^ flip_mask(glyphs.num_features, noise, rng)
+        for _ in range(count)
+    ]
+
+
+# Print one line of the recall table.
+def print_row(nprobe, num_lists, result):
+    found, agree, scanned, seconds, exact_seconds = result
+    print(
+        f"{nprobe:>6} {num_lists:>6} {100 * found:>7.1f}% {100 * agree:>8.1f}% "
+        f"{100 * scanned:>8.1f}% {1000 * seconds:>9.3f} {1000 * exact_seconds:>9.3f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build an inverted-file KNN index from k-means centroids "
+        "and measure its recall against brute force."
+    )
+    subparsers = parser.add_subparsers(dest="kind", required=True)
+
+    points = subparsers.add_parser("points", help="2D points, as for knn_2d")
+    points.add_argument("source", help="a dataset name or .txt/.pts file")
+
+    glyphs = subparsers.add_parser("glyphs", help="digit glyphs, as for knn_digits")
+    glyphs.add_argument(
+        "source",
+        nargs="?",
+        default="resources/digit_data.txt",
+        help="glyphs in the digit_data text format or a .gly file",
+    )
+    glyphs.add_argument(
+        "--noise", type=float, default=0.05, help="chance of flipping each query bit"
+    )
+
+    for subparser in (points, glyphs):
+        subparser.add_argument("--lists", type=int, default=32, help="k-means cells")
+        subparser.add_argument(
+            "--nprobe",
+            default="1,2,4,8",
+            help="comma-separated numbers of lists to scan per query",
+        )
+        subparser.add_argument("-k", "--neighbors", type=int, default=5)
+        subparser.add_argument("--queries", type=int, default=500)
+        subparser.add_argument("--seed", type=int, default=None, help="random seed")
+        metrics.add_argument(subparser)
+        profiling.add_argument(subparser)
+    args = parser.parse_args()
+    metrics.configure(args)
+    profiling.configure(args)
+
+    rng = random.Random(args.seed)
+    with profiling.section():
+        with metrics.phase("load"):
+            if args.kind == "points":
+                references = datasets.load_path(args.source)
+            elif args.source.endswith(datasets.GLYPH_SUFFIX):
+                references = datasets.read_glyphs(args.source)
+            else:
+                with open(args.source, "r") as f:
+                    references = GlyphSet.from_lines(f)
+
+        start = time.perf_counter()
+        with metrics.phase("build"):
+            if args.kind == "points":
+                index = PointIVF(references, args.lists, rng)
+                queries = point_queries(references, args.queries, rng)
+            else:
+                index = GlyphIVF(references, args.lists, rng)
+                queries = glyph_queries(references, args.queries, args.noise, rng)
+        sizes = [len(ids) for ids in index.indices]
+        print(
+            f"{len(references)} references in {len(sizes)} lists "
+            f"(sizes {min(sizes)} to {max(sizes)}), "
+            f"built in {round(time.perf_counter() - start, 2)} s"
+        )
+
+        print(
+            f"{'nprobe':>6} {'lists':>6} {'recall':>8} {'agreement':>9} "
+            f"{'scanned':>9} {'ms/query':>9} {'exact ms':>9}"
+        )
+        for nprobe in (int(n) for n in args.nprobe.split(",")):
+            with metrics.phase("search"):
+                result = recall(index, queries, args.neighbors, nprobe)
+            metrics.log("recall", nprobe=nprobe, recall=result[0])
+            print_row(nprobe, len(sizes), result)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,21 @@
-import math
+import argparse
+import os
 import tkinter as tk
 from tkinter import messagebox
 import random
-from statistics import mean
+
+import auto_k
+import bisecting
+import checkpoint
+import coreset
+import datasets
+import kmeans
+import metrics
+import profiling
+import restarts
+import threadpool
+from pointset import PointSet
+from render import PointRenderer, palette
 
 
 # Get the text in an Entry widget and
@@ -27,95 +40,74 @@ def make_field(parent, label_width, label_text, entry_width, entry_default):
     return entry
 
 
-class DataPoint:
-    POINT_RADIUS = 2
-    POINT_COLOR = "black"
+# Make Label and OptionMenu widgets for a choice.
+# Return the StringVar holding the choice.
+def make_option(parent, label_width, label_text, options, default):
+    frame = tk.Frame(parent)
+    frame.pack(side=tk.TOP)
+
+    label = tk.Label(frame, text=label_text, width=label_width, anchor=tk.W)
+    label.pack(side=tk.LEFT)
+
+    variable = tk.StringVar(value=default)
+    menu = tk.OptionMenu(frame, variable, *options)
+    menu.pack(side=tk.LEFT)
+
+    return variable
+
 
-    def __init__(self, canvas, x, y, radius=POINT_RADIUS, color=POINT_COLOR):
+class Seed:
+    def __init__(self, canvas, x, y, color):
         # Save parameters.
         self.x = x
         self.y = y
-        self.radius = radius
         self.canvas = canvas
         self.color = color
-        self.seed = None
-
-        # Make the DataPoint's oval. If `canvas`` is None, we have a dummy
-        # DataPoint that should not be drawn.
-        if self.canvas:
-            self.oval = self.canvas.create_oval(
-                x - self.radius,
-                y - self.radius,
-                x + self.radius,
-                y + self.radius,
-                fill=self.color,
-                outline=self.color,
-            )
 
-    # Set the DataPoint's color.
-    def set_color(self, color):
-        self.color = color
-        self.canvas.itemconfig(self.oval, fill=self.color, outline=self.color)
-
-    # Return the distance between this point and another one.
-    def distance(self, other):
-        return math.sqrt(((self.x - other.x) ** 2) + ((self.y - other.y) ** 2))
-
-    # Assign this data point to the closest seed.
-    def assign_seed(self, seeds):
-        self.seed = min(seeds, key=self.distance)
-        self.set_color(self.seed.color)
-
-    # Reposition this seed given its currently assigned data points.
-    # Return the distance moved.
-    def reposition_seed(self, points):
-        old_x, old_y = self.x, self.y
-        self.x = mean(point.x for point in points)
-        self.y = mean(point.y for point in points)
-        self.move()
-        # Use a dummy DataPoint to calculate the distance.
-        return self.distance(DataPoint(None, old_x, old_y))
-
-    # Move the seed's oval to its current location.
-    def move(self):
-        x = self.x - self.radius
-        y = self.y - self.radius
-        self.canvas.moveto(self.oval, x, y)
+        # Make the seed's oval.
+        self.oval = self.canvas.create_oval(
+            x - SEED_RADIUS,
+            y - SEED_RADIUS,
+            x + SEED_RADIUS,
+            y + SEED_RADIUS,
+            fill=self.color,
+            outline=self.color,
+        )
+        metrics.count("canvas_ops")
+
+    # Move the seed and its oval to a new location.
+    def move_to(self, x, y):
+        self.x, self.y = x, y
+        self.canvas.moveto(self.oval, x - SEED_RADIUS, y - SEED_RADIUS)
+        metrics.count("canvas_ops")
 
 
 # Geometry constants.
 WINDOW_WID = 500
-WINDOW_HGT = 300
+WINDOW_HGT = 400
 MARGIN = 5
 CANVAS_WID = WINDOW_WID - 200
 CANVAS_HGT = WINDOW_HGT - 2 * MARGIN
 SEED_RADIUS = 5
+POINT_RADIUS = 2
+POINT_COLOR = "black"
 
 # Stop running when the seeds are not moving more than this distance.
 STOP_DISTANCE = 1
 
-# Define some seed colors.
-colors = [
-    "red",
-    "lightgreen",
-    "blue",
-    "pink",
-    "green",
-    "lightblue",
-    "cyan",
-    "magenta",
-    "yellow",
-    "orange",
-    "gray",
-]
+# Headless runs save a checkpoint this often, in iterations, unless told
+# otherwise.
+CHECKPOINT_EVERY = 10
 
 
 class App:
     # Create and manage the tkinter interface.
-    def __init__(self):
+    def __init__(self, threads=1):
+        self.threads = threads
         self.running = False
-        self.data_points = []
+        self.data_points = PointSet()
         self.seeds = []
+        self.model = None
 
         # Make the main interface.
         self.window = tk.Tk()
@@ -143,6 +135,9 @@ class App:
         self.canvas.pack(side=tk.LEFT, padx=MARGIN, pady=MARGIN)
         self.canvas.bind("<Button-1>", self.left_click)
 
+        # The data points are drawn in bulk as a single image.
+        self.renderer = PointRenderer(self.canvas, CANVAS_WID, CANVAS_HGT, POINT_RADIUS)
+
         # Right frame.
         right_frame = tk.Frame(self.window, pady=MARGIN)
         right_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -153,29 +148,34 @@ class App:
         # Delay (ms).
         self.delay_entry = make_field(right_frame, 11, "Delay (ms):", 5, "500")
 
-        # Test data set buttons.
-        button_frame = tk.Frame(right_frame, pady=MARGIN)
-        button_frame.pack(side=tk.TOP)
-        test1_button = tk.Button(
-            button_frame, text="Dataset 1", width=8, command=self.load_dataset_1
-        )
-        test1_button.pack(side=tk.LEFT)
-        test2_button = tk.Button(
-            button_frame, text="Dataset 2", width=8, command=self.load_dataset_2
-        )
-        test2_button.pack(side=tk.LEFT, padx=(MARGIN, 0))
+        # Number of iterations to run per frame drawn.
+        self.render_every_entry = make_field(right_frame, 11, "Render every:", 5, "1")
 
-        # Test data set buttons.
-        button_frame = tk.Frame(right_frame, pady=MARGIN)
-        button_frame.pack(side=tk.TOP)
-        test3_button = tk.Button(
-            button_frame, text="Dataset 3", width=8, command=self.load_dataset_3
-        )
-        test3_button.pack(side=tk.LEFT)
-        test4_button = tk.Button(
-            button_frame, text="Dataset 4", width=8, command=self.load_dataset_4
+        # Seeding strategy, and the random seed that makes runs
+        # reproducible. Leave it empty for a different run every time.
+        self.seeding_value = make_option(
+            right_frame, 11, "Seeding:", list(kmeans.SEEDINGS), "k-means++"
         )
-        test4_button.pack(side=tk.LEFT, padx=(MARGIN, 0))
+        self.rng_seed_entry = make_field(right_frame, 11, "RNG seed:", 5, "")
+
+        # Number of independent restarts to run in parallel.
+        self.num_restarts_entry = make_field(right_frame, 11, "Restarts:", 5, "1")
+
+        # Largest k that Auto k tries.
+        self.max_k_entry = make_field(right_frame, 11, "Max k:", 5, "10")
+
+        # Dataset buttons, two per row.
+        for i, name in enumerate(datasets.list_datasets()):
+            if i % 2 == 0:
+                button_frame = tk.Frame(right_frame, pady=MARGIN)
+                button_frame.pack(side=tk.TOP)
+            button = tk.Button(
+                button_frame,
+                text=name.replace("_", " ").capitalize(),
+                width=8,
+                command=lambda name=name: self.load_dataset(name),
+            )
+            button.pack(side=tk.LEFT, padx=(MARGIN if i % 2 else 0, 0))
 
         # Run button.
         self.run_button = tk.Button(
@@ -183,6 +183,26 @@ class App:
         )
         self.run_button.pack(side=tk.TOP, pady=(20, 0))
 
+        # Bisect and Auto k buttons.
+        button_frame = tk.Frame(right_frame)
+        button_frame.pack(side=tk.TOP, pady=(MARGIN, 0))
+        self.bisect_button = tk.Button(
+            button_frame,
+            text="Bisect",
+            width=7,
+            command=self.bisect,
+            state=tk.DISABLED,
+        )
+        self.bisect_button.pack(side=tk.LEFT)
+        self.auto_k_button = tk.Button(
+            button_frame,
+            text="Auto k",
+            width=7,
+            command=self.auto_k,
+            state=tk.DISABLED,
+        )
+        self.auto_k_button.pack(side=tk.LEFT, padx=(MARGIN, 0))
+
         # Reset button.
         self.reset_button = tk.Button(
             right_frame, text="Reset", width=7, command=self.reset, state=tk.DISABLED
@@ -196,16 +216,34 @@ class App:
         self.clear_button.pack(side=tk.TOP, pady=(MARGIN, 0))
 
     def left_click(self, event):
-        self.data_points.append(DataPoint(self.canvas, event.x, event.y))
+        self.add_point(event.x, event.y)
         self.set_button_states()
 
+    # Save and draw a data point.
+    def add_point(self, x, y):
+        self.data_points.add(x, y)
+        self.renderer.draw_point(x, y, POINT_COLOR)
+        self.renderer.blit()
+
+    # Redraw all data points in their seeds' colors.
+    def redraw_points(self):
+        points = self.data_points
+        colors = [seed.color for seed in self.seeds]
+        self.renderer.draw_points(
+            points.xs, points.ys, points.assignments, colors, POINT_COLOR
+        )
+
     def set_button_states(self):
         if len(self.data_points) > 0 and not self.running:
             self.reset_button["state"] = tk.NORMAL
             self.clear_button["state"] = tk.NORMAL
+            self.bisect_button["state"] = tk.NORMAL
+            self.auto_k_button["state"] = tk.NORMAL
         else:
             self.reset_button["state"] = tk.DISABLED
             self.clear_button["state"] = tk.DISABLED
+            self.bisect_button["state"] = tk.DISABLED
+            self.auto_k_button["state"] = tk.DISABLED
 
         if len(self.data_points) > 0:
             self.run_button["state"] = tk.NORMAL
@@ -232,24 +270,130 @@ class App:
             messagebox.showinfo("seeds Error", "You must create at least one seed.")
             return
 
+        # With several restarts and no seeds yet, run them all at once and
+        # show only the best.
+        rng_seed = self.rng_seed_entry.get().strip()
+        rng = random.Random(int(rng_seed) if rng_seed else None)
+        method = self.seeding_value.get()
+        num_restarts = get_int(self.num_restarts_entry)
+        if len(self.seeds) == 0 and num_restarts > 1:
+            self.run_restarts(num_clusters, num_restarts, method, rng)
+            return
+
         self.running = True
         self.run_button.config(text="Stop")
         self.set_button_states()
 
-        # If we don't already have seeds, make some.
+        # If we don't already have seeds, make a new engine and seed it.
         if len(self.seeds) == 0:
-            points = random.sample(self.data_points, k=num_clusters)
-            for i, p in enumerate(points):
-                new_seed = DataPoint(
-                    p.canvas, p.x, p.y, radius=SEED_RADIUS, color=colors[i]
-                )
-                self.seeds.append(new_seed)
-
-        # Go!
+            self.model = kmeans.KMeans(
+                self.data_points,
+                num_clusters,
+                method,
+                rng,
+                STOP_DISTANCE,
+                threads=self.threads,
+            )
+            with profiling.section():
+                self.model.seed()
+            self.make_seeds()
+
+        # Go! The engine runs the iterations; we only draw some of them.
         print()
-        self.num_ticks = 0
+        self.iterations = self.model.iterate()
         self.tick()
 
+    # Make a seed for each of the engine's centers, in generated colors so
+    # any number of clusters can be shown.
+    def make_seeds(self):
+        colors = palette(len(self.model.centers))
+        for (x, y), color in zip(self.model.centers, colors):
+            self.seeds.append(Seed(self.canvas, x, y, color))
+
+    # Run independent k-means restarts across a process pool and keep the
+    # one with the lowest inertia.
+    def run_restarts(self, num_clusters, num_restarts, method, rng):
+        with profiling.section():
+            results = restarts.run_restarts(
+                self.data_points, num_clusters, num_restarts, method, rng, STOP_DISTANCE
+            )
+        print()
+        for inertia, _, iterations in results:
+            print(f"Restart: {iterations} ticks, inertia {round(inertia, 1)}")
+
+        # Show the best result.
+        inertia, centers, iterations = results[0]
+        self.model = kmeans.KMeans(
+            self.data_points,
+            num_clusters,
+            method,
+            rng,
+            STOP_DISTANCE,
+            threads=self.threads,
+        )
+        self.model.seed(centers)
+        self.make_seeds()
+        kmeans.assign_points(self.data_points, centers)
+        self.redraw_points()
+        print(f"Best of {num_restarts} restarts: inertia {round(inertia, 1)}")
+        self.set_button_states()
+
+    # Cluster the points with bisecting k-means and show the result. The
+    # seeds are left in place, so Run can refine them with Lloyd's
+    # algorithm afterwards.
+    def bisect(self):
+        num_clusters = get_int(self.num_clusters_entry)
+        if num_clusters < 1:
+            messagebox.showinfo("seeds Error", "You must create at least one seed.")
+            return
+        rng_seed = self.rng_seed_entry.get().strip()
+        rng = random.Random(int(rng_seed) if rng_seed else None)
+
+        self.reset()
+        with profiling.section():
+            tree = bisecting.BisectingKMeans(
+                self.data_points, num_clusters, rng, STOP_DISTANCE
+            )
+        centers = [leaf.center for leaf in tree.cut(num_clusters)]
+        self.model = kmeans.KMeans(
+            self.data_points,
+            len(centers),
+            self.seeding_value.get(),
+            rng,
+            STOP_DISTANCE,
+            threads=self.threads,
+        )
+        self.model.seed(centers)
+        self.make_seeds()
+        with profiling.section():
+            tree.assign(num_clusters)
+        self.redraw_points()
+
+        inertia = round(self.model.inertia(), 1)
+        print()
+        print(f"Bisected into {len(centers)} clusters, inertia {inertia}")
+        self.set_button_states()
+
+    # Score every k from 1 to "Max k" and put the recommended one in the
+    # "# Clusters" field.
+    def auto_k(self):
+        max_k = min(get_int(self.max_k_entry), len(self.data_points))
+        if max_k < 1:
+            messagebox.showinfo(
+                "Max k Error", "Max k must be at least 1, and there must be points."
+            )
+            return
+        rng_seed = self.rng_seed_entry.get().strip()
+        rng = random.Random(int(rng_seed) if rng_seed else None)
+        with profiling.section():
+            best_k, elbow_k, rows = auto_k.select_k(
+                self.data_points, 1, max_k, self.seeding_value.get(), rng
+            )
+        print()
+        auto_k.print_table(rows, best_k, elbow_k)
+        self.num_clusters_entry.delete(0, tk.END)
+        self.num_clusters_entry.insert(tk.END, str(best_k))
+
     def run(self):
         # See if we are currently running.
         if self.running:
@@ -257,295 +401,303 @@ class App:
         else:
             self.start_running()
 
-    # Perform one k-means round.
-    # If the maximum distance that any seed moved is
-    # less than STOP_DISTANCE, then stop.
+    # Advance the engine by "Render every" iterations and draw the result.
+    # If the seeds have stopped moving more than STOP_DISTANCE, then stop.
     def tick(self):
-        self.num_ticks += 1
-        print(f"Tick {self.num_ticks}")
+        # Collect the points whose seed changed along the way.
+        changed = set()
+        with profiling.section():
+            for _ in range(get_int(self.render_every_entry)):
+                if next(self.iterations, None) is None:
+                    break
+                changed.update(self.model.engine.changed)
+                if self.model.done():
+                    break
+
+        # Recolor the changed points and move the seeds.
+        self.recolor_points(changed)
+        for seed, (x, y) in zip(self.seeds, self.model.centers):
+            seed.move_to(x, y)
+        skipped = round(100 * self.model.engine.skipped_fraction, 1)
+        print(
+            f"Tick {self.model.iterations}, {len(changed)} points changed, "
+            f"skipped {skipped}% of distance computations"
+        )
+        metrics.log(
+            "tick",
+            iteration=self.model.iterations,
+            changed=len(changed),
+            shift=self.model.shift,
+            skipped=self.model.engine.skipped_fraction,
+        )
 
-        # Assign points to their nearest seeds.
-        self.assign_points_to_seeds()
+        if self.model.done():
+            # Overlapping points may have been recolored out of order, so
+            # draw the final result in full.
+            self.redraw_points()
 
-        # Reposition the seeds.
-        if self.reposition_seeds() < STOP_DISTANCE:
-            # Stop running.
+            # Report the result and stop running.
+            inertia = round(self.model.inertia(), 1)
+            print(f"Converged after {self.model.iterations} ticks, inertia {inertia}")
             self.stop_running()
 
         # If we're still running, schedule another tick.
         if self.running:
             self.window.after(get_int(self.delay_entry), self.tick)
 
-    # Assign points to their nearest seeds.
-    def assign_points_to_seeds(self):
-        for p in self.data_points:
-            p.assign_seed(self.seeds)
-
-    # Reposition the seeds.
-    # Return the largest distance that any seed moves.
-    def reposition_seeds(self):
-        distances = []
-        for seed in self.seeds:
-            points = [point for point in self.data_points if point.seed == seed]
-            distances.append(seed.reposition_seed(points))
-        return max(distances)
+    # Recolor only the given points in their seeds' colors.
+    def recolor_points(self, indices):
+        points = self.data_points
+        colors = [seed.color for seed in self.seeds]
+        self.renderer.update_points(
+            points.xs, points.ys, points.assignments, list(indices), colors, POINT_COLOR
+        )
 
     # Remove the seeds so we can try again with the same points.
     def reset(self):
-        # Reset the data points.
-        for point in self.data_points:
-            point.set_color("black")
-            point.seed = None
-
         # Remove the seeds.
         for seed in self.seeds:
             self.canvas.delete(seed.oval)
         self.seeds = []
+        self.model = None
+
+        # Reset the data points.
+        self.data_points.clear_assignments()
+        self.redraw_points()
 
         # Reset the button states.
         self.set_button_states()
 
-    # Destroy all seeds, DataPoints, and ovals.
+    # Destroy all seeds, data points, and ovals.
     def clear(self):
         self.canvas.delete("all")
-        self.data_points = []
+        self.renderer.reset()
+        self.data_points = PointSet()
         self.seeds = []
+        self.model = None
+        self.set_button_states()
+
+    # Replace the current points with a registered dataset. The points'
+    # labels are not needed for clustering.
+    def load_dataset(self, name):
+        self.stop_running()
+        self.clear()
+        with profiling.section(), metrics.phase("load"):
+            self.data_points = datasets.load_dataset(name, labels=False)
+        self.redraw_points()
         self.set_button_states()
 
     def kill_callback(self):
         self.window.destroy()
 
-    def load_dataset_1(self):
-        self.stop_running()
-        self.canvas.delete("all")
-        self.seeds = []
-        self.data_points = [
-            DataPoint(self.canvas, 62, 80),
-            DataPoint(self.canvas, 82, 58),
-            DataPoint(self.canvas, 95, 91),
-            DataPoint(self.canvas, 111, 54),
-            DataPoint(self.canvas, 80, 82),
-            DataPoint(self.canvas, 136, 86),
-            DataPoint(self.canvas, 121, 108),
-            DataPoint(self.canvas, 106, 75),
-            DataPoint(self.canvas, 96, 105),
-            DataPoint(self.canvas, 67, 124),
-            DataPoint(self.canvas, 165, 217),
-            DataPoint(self.canvas, 166, 198),
-            DataPoint(self.canvas, 193, 219),
-            DataPoint(self.canvas, 225, 237),
-            DataPoint(self.canvas, 207, 248),
-            DataPoint(self.canvas, 171, 260),
-            DataPoint(self.canvas, 150, 234),
-            DataPoint(self.canvas, 184, 240),
-            DataPoint(self.canvas, 184, 264),
-            DataPoint(self.canvas, 176, 222),
-            DataPoint(self.canvas, 194, 199),
-            DataPoint(self.canvas, 212, 216),
-            DataPoint(self.canvas, 240, 98),
-            DataPoint(self.canvas, 215, 101),
-            DataPoint(self.canvas, 220, 129),
-            DataPoint(self.canvas, 223, 113),
-            DataPoint(self.canvas, 242, 122),
-            DataPoint(self.canvas, 253, 113),
-            DataPoint(self.canvas, 244, 85),
-            DataPoint(self.canvas, 219, 72),
-            DataPoint(self.canvas, 235, 144),
-            DataPoint(self.canvas, 266, 131),
-            DataPoint(self.canvas, 259, 92),
-            DataPoint(self.canvas, 205, 119),
-            DataPoint(self.canvas, 63, 100),
-        ]
-        self.set_button_states()
 
-    def load_dataset_2(self):
-        self.stop_running()
-        self.canvas.delete("all")
-        self.seeds = []
-        self.data_points = [
-            DataPoint(self.canvas, 198, 69),
-            DataPoint(self.canvas, 215, 75),
-            DataPoint(self.canvas, 213, 99),
-            DataPoint(self.canvas, 220, 127),
-            DataPoint(self.canvas, 211, 149),
-            DataPoint(self.canvas, 63, 192),
-            DataPoint(self.canvas, 92, 208),
-            DataPoint(self.canvas, 164, 209),
-            DataPoint(self.canvas, 91, 68),
-            DataPoint(self.canvas, 54, 107),
-            DataPoint(self.canvas, 50, 134),
-            DataPoint(self.canvas, 136, 59),
-            DataPoint(self.canvas, 174, 58),
-            DataPoint(self.canvas, 212, 191),
-            DataPoint(self.canvas, 202, 170),
-            DataPoint(self.canvas, 192, 194),
-            DataPoint(self.canvas, 167, 192),
-            DataPoint(self.canvas, 143, 192),
-            DataPoint(self.canvas, 129, 209),
-            DataPoint(self.canvas, 142, 225),
-            DataPoint(self.canvas, 101, 228),
-            DataPoint(self.canvas, 99, 189),
-            DataPoint(self.canvas, 72, 220),
-            DataPoint(self.canvas, 45, 181),
-            DataPoint(self.canvas, 70, 179),
-            DataPoint(self.canvas, 55, 160),
-            DataPoint(self.canvas, 36, 160),
-            DataPoint(self.canvas, 36, 140),
-            DataPoint(self.canvas, 45, 150),
-            DataPoint(self.canvas, 42, 113),
-            DataPoint(self.canvas, 60, 68),
-            DataPoint(self.canvas, 59, 88),
-            DataPoint(self.canvas, 99, 56),
-            DataPoint(self.canvas, 82, 93),
-            DataPoint(self.canvas, 127, 36),
-            DataPoint(self.canvas, 151, 53),
-            DataPoint(self.canvas, 150, 20),
-            DataPoint(self.canvas, 124, 48),
-            DataPoint(self.canvas, 200, 48),
-            DataPoint(self.canvas, 180, 40),
-            DataPoint(self.canvas, 166, 35),
-            DataPoint(self.canvas, 224, 96),
-            DataPoint(self.canvas, 240, 136),
-            DataPoint(self.canvas, 238, 115),
-            DataPoint(self.canvas, 230, 114),
-            DataPoint(self.canvas, 223, 133),
-            DataPoint(self.canvas, 231, 158),
-            DataPoint(self.canvas, 216, 177),
-            DataPoint(self.canvas, 206, 176),
-            DataPoint(self.canvas, 183, 179),
-            DataPoint(self.canvas, 195, 212),
-            DataPoint(self.canvas, 138, 127),
-            DataPoint(self.canvas, 133, 114),
-            DataPoint(self.canvas, 155, 114),
-            DataPoint(self.canvas, 151, 131),
-            DataPoint(self.canvas, 145, 120),
-            DataPoint(self.canvas, 142, 142),
-            DataPoint(self.canvas, 131, 133),
-            DataPoint(self.canvas, 125, 123),
-            DataPoint(self.canvas, 124, 144),
-        ]
-        self.set_button_states()
+# Cluster a dataset without the GUI and print the result.
+def run_headless(args):
+    with metrics.phase("load"):
+        points = datasets.load_path(args.headless, labels=False)
+    rng = random.Random(args.seed)
+
+    # Optionally cluster a weighted coreset and map the result back.
+    original, weights = points, None
+    if args.coreset is not None:
+        summary = coreset.Coreset(points, args.coreset)
+        points, weights = summary.points, summary.weights
+        print(
+            f"Coreset: {len(points)} weighted points for {len(original)}, "
+            f"scatter {round(summary.scatter, 1)}"
+        )
 
-    def load_dataset_3(self):
-        self.stop_running()
-        self.canvas.delete("all")
-        self.seeds = []
-        self.data_points = [
-            DataPoint(self.canvas, 100, 87),
-            DataPoint(self.canvas, 92, 62),
-            DataPoint(self.canvas, 74, 84),
-            DataPoint(self.canvas, 123, 75),
-            DataPoint(self.canvas, 140, 76),
-            DataPoint(self.canvas, 174, 76),
-            DataPoint(self.canvas, 202, 77),
-            DataPoint(self.canvas, 190, 60),
-            DataPoint(self.canvas, 155, 67),
-            DataPoint(self.canvas, 189, 83),
-            DataPoint(self.canvas, 218, 113),
-            DataPoint(self.canvas, 207, 97),
-            DataPoint(self.canvas, 233, 85),
-            DataPoint(self.canvas, 230, 100),
-            DataPoint(self.canvas, 193, 116),
-            DataPoint(self.canvas, 187, 128),
-            DataPoint(self.canvas, 179, 114),
-            DataPoint(self.canvas, 199, 123),
-            DataPoint(self.canvas, 173, 142),
-            DataPoint(self.canvas, 167, 133),
-            DataPoint(self.canvas, 167, 160),
-            DataPoint(self.canvas, 156, 161),
-            DataPoint(self.canvas, 157, 145),
-            DataPoint(self.canvas, 113, 172),
-            DataPoint(self.canvas, 135, 153),
-            DataPoint(self.canvas, 140, 169),
-            DataPoint(self.canvas, 126, 164),
-            DataPoint(self.canvas, 90, 188),
-            DataPoint(self.canvas, 103, 191),
-            DataPoint(self.canvas, 115, 187),
-            DataPoint(self.canvas, 129, 195),
-            DataPoint(self.canvas, 129, 176),
-            DataPoint(self.canvas, 103, 195),
-            DataPoint(self.canvas, 86, 221),
-            DataPoint(self.canvas, 69, 212),
-            DataPoint(self.canvas, 67, 228),
-            DataPoint(self.canvas, 83, 238),
-            DataPoint(self.canvas, 107, 212),
-            DataPoint(self.canvas, 106, 235),
-            DataPoint(self.canvas, 139, 259),
-            DataPoint(self.canvas, 124, 253),
-            DataPoint(self.canvas, 117, 253),
-            DataPoint(self.canvas, 125, 240),
-            DataPoint(self.canvas, 183, 253),
-            DataPoint(self.canvas, 207, 228),
-            DataPoint(self.canvas, 207, 231),
-            DataPoint(self.canvas, 209, 244),
-            DataPoint(self.canvas, 202, 240),
-            DataPoint(self.canvas, 199, 256),
-            DataPoint(self.canvas, 182, 238),
-            DataPoint(self.canvas, 169, 248),
-            DataPoint(self.canvas, 147, 241),
-            DataPoint(self.canvas, 151, 258),
-            DataPoint(self.canvas, 170, 260),
-            DataPoint(self.canvas, 64, 130),
-            DataPoint(self.canvas, 64, 143),
-            DataPoint(self.canvas, 50, 137),
-            DataPoint(self.canvas, 51, 123),
-            DataPoint(self.canvas, 48, 157),
-            DataPoint(self.canvas, 43, 152),
-            DataPoint(self.canvas, 59, 152),
-            DataPoint(self.canvas, 37, 135),
-            DataPoint(self.canvas, 218, 163),
-            DataPoint(self.canvas, 220, 169),
-            DataPoint(self.canvas, 235, 173),
-            DataPoint(self.canvas, 223, 152),
-            DataPoint(self.canvas, 248, 152),
-            DataPoint(self.canvas, 227, 164),
-            DataPoint(self.canvas, 247, 176),
-            DataPoint(self.canvas, 239, 155),
-            DataPoint(self.canvas, 239, 189),
-            DataPoint(self.canvas, 227, 179),
-            DataPoint(self.canvas, 211, 180),
-            DataPoint(self.canvas, 95, 76),
-            DataPoint(self.canvas, 114, 74),
-            DataPoint(self.canvas, 114, 74),
-            DataPoint(self.canvas, 114, 74),
-            DataPoint(self.canvas, 118, 57),
-            DataPoint(self.canvas, 145, 57),
-        ]
-        self.set_button_states()
+    # Optionally choose k first.
+    if args.auto_k is not None:
+        best_k, elbow_k, rows = auto_k.select_k(
+            points,
+            1,
+            args.auto_k,
+            args.seeding,
+            rng,
+            args.sample_size,
+            STOP_DISTANCE,
+            args.max_iterations,
+            weights=weights,
+        )
+        auto_k.print_table(rows, best_k, elbow_k)
+        args.clusters = best_k
 
-    def load_dataset_4(self):
-        self.stop_running()
-        self.canvas.delete("all")
-        self.seeds = []
-        self.data_points = [
-            DataPoint(self.canvas, 139, 31),
-            DataPoint(self.canvas, 127, 60),
-            DataPoint(self.canvas, 137, 117),
-            DataPoint(self.canvas, 137, 160),
-            DataPoint(self.canvas, 147, 120),
-            DataPoint(self.canvas, 115, 96),
-            DataPoint(self.canvas, 141, 90),
-            DataPoint(self.canvas, 152, 60),
-            DataPoint(self.canvas, 156, 112),
-            DataPoint(self.canvas, 123, 74),
-            DataPoint(self.canvas, 68, 241),
-            DataPoint(self.canvas, 80, 228),
-            DataPoint(self.canvas, 115, 249),
-            DataPoint(self.canvas, 135, 240),
-            DataPoint(self.canvas, 155, 219),
-            DataPoint(self.canvas, 169, 242),
-            DataPoint(self.canvas, 193, 248),
-            DataPoint(self.canvas, 120, 219),
-            DataPoint(self.canvas, 155, 255),
-            DataPoint(self.canvas, 211, 229),
-            DataPoint(self.canvas, 190, 221),
-            DataPoint(self.canvas, 245, 232),
-        ]
-        self.set_button_states()
+    if args.bisecting:
+        tree = bisecting.BisectingKMeans(
+            points, args.clusters, rng, STOP_DISTANCE, args.max_iterations, weights
+        )
+        centers = tree.assign(args.clusters)
+        inertia = kmeans.inertia(points, centers, weights)
+        iterations = tree.iterations
+        print(f"Bisecting k-means, {tree.num_splits} splits")
+    elif args.restarts > 1:
+        results = restarts.run_restarts(
+            points,
+            args.clusters,
+            args.restarts,
+            args.seeding,
+            rng,
+            STOP_DISTANCE,
+            args.max_iterations,
+            weights=weights,
+        )
+        inertia, centers, iterations = results[0]
+        kmeans.assign_points(points, centers)
+        print(f"Best of {args.restarts} restarts")
+    else:
+        model = kmeans.KMeans(
+            points,
+            args.clusters,
+            args.seeding,
+            rng,
+            STOP_DISTANCE,
+            args.max_iterations,
+            weights,
+            args.threads,
+        )
+
+        # Report progress every Nth iteration.
+        def report(model):
+            metrics.log(
+                "iteration",
+                iteration=model.iterations,
+                shift=model.shift,
+                skipped=model.engine.skipped_fraction,
+            )
+            skipped = round(100 * model.engine.skipped_fraction, 1)
+            print(
+                f"Iteration {model.iterations}: shift {round(model.shift, 3)}, "
+                f"skipped {skipped}% of distance computations"
+            )
+
+        # Optionally pick up where a previous run stopped, and save
+        # checkpoints as we go.
+        saver = None
+        restored = False
+        if args.checkpoint is not None:
+            if args.resume and os.path.exists(args.checkpoint):
+                checkpoint.restore(args.checkpoint, model)
+                restored = True
+                print(f"Resumed from {args.checkpoint} at iteration {model.iterations}")
+            saver = checkpoint.Checkpointer(
+                args.checkpoint, args.checkpoint_every, args.checkpoint_seconds
+            )
+
+        def progress(model):
+            if model.iterations % args.every == 0 or model.done():
+                report(model)
+            if saver is not None:
+                saver.update(model)
+
+        # A run that was checkpointed after it finished has nothing left to do.
+        if not (restored and model.done()):
+            model.run(progress)
+        inertia, centers, iterations = model.inertia(), model.centers, model.iterations
+
+    if args.coreset is not None:
+        # The bounds hold for the representatives' nearest centers.
+        kmeans.assign_points(points, centers)
+        inertia = kmeans.inertia(points, centers, weights)
+        summary.expand()
+        low, high = summary.inertia_bounds(inertia)
+        print(
+            f"Coreset inertia {round(inertia, 1)}; "
+            f"full inertia between {round(low, 1)} and {round(high, 1)}"
+        )
+        inertia = kmeans.inertia(original, centers)
+        points = original
+    print(f"{len(points)} points, {iterations} iterations, inertia {round(inertia, 1)}")
+    for x, y in centers:
+        print(f"Center ({round(x, 2)}, {round(y, 2)})")
 
 
 def main():
-    App()
+    parser = argparse.ArgumentParser(description="k-means clustering of 2D points.")
+    parser.add_argument(
+        "--headless",
+        metavar="DATASET",
+        help="cluster a dataset name or .txt/.pts file without the GUI",
+    )
+    parser.add_argument("-k", "--clusters", type=int, default=2)
+    parser.add_argument("--seeding", choices=list(kmeans.SEEDINGS), default="k-means++")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    parser.add_argument("--restarts", type=int, default=1)
+    parser.add_argument(
+        "--auto-k",
+        type=int,
+        metavar="MAX_K",
+        help="try every k up to MAX_K and cluster with the best one",
+    )
+    parser.add_argument(
+        "--sample-size",
+        type=int,
+        default=500,
+        help="points sampled for the silhouette score",
+    )
+    parser.add_argument(
+        "--coreset",
+        type=float,
+        metavar="CELL",
+        help="cluster cell centroids weighted by their point counts (0 merges "
+        "only duplicates)",
+    )
+    parser.add_argument(
+        "--bisecting",
+        action="store_true",
+        help="split the worst cluster in two until there are k clusters",
+    )
+    parser.add_argument("--max-iterations", type=int, default=None)
+    parser.add_argument(
+        "--every", type=int, default=1, help="report every Nth iteration"
+    )
+    parser.add_argument(
+        "--checkpoint",
+        metavar="FILE",
+        help="save the k-means state to FILE while running",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        metavar="N",
+        help="save a checkpoint every N iterations",
+    )
+    parser.add_argument(
+        "--checkpoint-seconds",
+        type=float,
+        metavar="T",
+        help="save a checkpoint every T seconds",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue from the checkpoint file if it exists",
+    )
+    threadpool.add_argument(parser)
+    metrics.add_argument(parser)
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    if args.auto_k is not None and args.auto_k < 1:
+        parser.error("--auto-k must be at least 1")
+    if args.max_iterations is not None and args.max_iterations < 1:
+        parser.error("--max-iterations must be at least 1")
+    if args.checkpoint is None and (
+        args.resume or args.checkpoint_every or args.checkpoint_seconds
+    ):
+        parser.error("--resume and the checkpoint intervals need --checkpoint")
+    if args.checkpoint is not None and (args.bisecting or args.restarts > 1):
+        parser.error("--checkpoint only works with plain k-means runs")
+    if args.checkpoint_every is None and args.checkpoint_seconds is None:
+        args.checkpoint_every = CHECKPOINT_EVERY
+    metrics.configure(args)
+    profiling.configure(args)
+    threadpool.check(args.threads)
+
+    if args.headless is None:
+        App(args.threads)
+    else:
+        with profiling.section():
+            run_headless(args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,73 @@
+import math
+from array import array
+
+# Distance kernels shared by the apps. Squared Euclidean distances rank
+# points the same as real ones, so nothing here takes a square root; the
+# Hamming distance between packed glyphs is the popcount of their XOR,
+# which for 0/1 features is also the squared Euclidean distance.
+#
+# The batched forms loop in one comprehension instead of calling a
+# function per pair. Given precomputed squared norms, the Euclidean one
+# uses |a - b|^2 = |a|^2 + |b|^2 - 2 a.b, which saves the subtractions and
+# is about a quarter faster. That form is exact for integer coordinates
+# below 2**26, like the apps' datasets; for other values it is off by a
+# rounding error of the norms, so near-ties may rank differently and the
+# result can be slightly negative for coincident points. Without norms
+# the batched forms use the same arithmetic as the single-pair kernel.
+
+
+# Return the squared Euclidean distance between (ax, ay) and (bx, by).
+def sq_euclidean(ax, ay, bx, by):
+    dx = ax - bx
+    dy = ay - by
+    return dx * dx + dy * dy
+
+
+# Return the Hamming distance between two packed glyphs.
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+# Return the squared norm of every point.
+def sq_norms(xs, ys):
+    return array("d", [x * x + y * y for x, y in zip(xs, ys)])
+
+
+# Return the squared Euclidean distances from (x, y) to every point. If
+# the points' squared norms are given, use the norm expansion.
+def sq_euclidean_to_many(x, y, xs, ys, norms=None):
+    if norms is None:
+        return [(px - x) * (px - x) + (py - y) * (py - y) for px, py in zip(xs, ys)]
+    own = x * x + y * y
+    mx = -2 * x
+    my = -2 * y
+    return [own + n + mx * px + my * py for px, py, n in zip(xs, ys, norms)]
+
+
+# Return the Hamming distances from a packed glyph to every glyph.
+def hamming_to_many(bits, others):
+    return [(bits ^ other).bit_count() for other in others]
+
+
+# Return the index of the center nearest to (x, y) and its squared
+# distance. `centers` is a list of (x, y) tuples; ties go to the first.
+def nearest_sq_euclidean(x, y, centers):
+    best = 0
+    best_distance = math.inf
+    for c, (cx, cy) in enumerate(centers):
+        d = (x - cx) * (x - cx) + (y - cy) * (y - cy)
+        if d < best_distance:
+            best, best_distance = c, d
+    return best, best_distance
+
+
+# Return the index of the center nearest to a packed glyph and their
+# Hamming distance. Ties go to the first center.
+def nearest_hamming(bits, centers):
+    best = 0
+    best_distance = math.inf
+    for c, center in enumerate(centers):
+        d = (bits ^ center).bit_count()
+        if d < best_distance:
+            best, best_distance = c, d
+    return best, best_distance
@@ -0,0 +1,513 @@
+import bisect
+import math
+import random
+from array import array
+from itertools import accumulate, repeat
+
+import kernels
+import metrics
+import threadpool
+
+
+# Assign every point to its nearest center without moving the centers.
+def assign_points(points, centers):
+    assignments = points.assignments
+    metrics.count("distances", len(points) * len(centers))
+    for i, (x, y) in enumerate(zip(points.xs, points.ys)):
+        assignments[i], _ = kernels.nearest_sq_euclidean(x, y, centers)
+
+
+# Return the centers given the per-cluster sums and counts, and the largest
+# distance any center moved. Empty clusters keep their old center.
+def update_centers(centers, sum_xs, sum_ys, counts):
+    new_centers = []
+    shift2 = 0.0
+    for (cx, cy), sum_x, sum_y, count in zip(centers, sum_xs, sum_ys, counts):
+        if count > 0:
+            x, y = sum_x / count, sum_y / count
+        else:
+            x, y = cx, cy
+        shift2 = max(shift2, kernels.sq_euclidean(x, y, cx, cy))
+        new_centers.append((x, y))
+    return new_centers, math.sqrt(shift2)
+
+
+# Distances between centers are compared against bounds that were updated
+# with floating-point arithmetic. Shrink every test by this relative margin
+# so rounding can never prune a point whose assignment might change.
+BOUND_TOLERANCE = 1e-9
+
+
+class Hamerly:
+    # Lloyd iterations accelerated with Hamerly's triangle-inequality
+    # bounds. Each point keeps an upper bound on the distance to its own
+    # center and a lower bound on the distance to every other center. When
+    # the upper bound is below the lower bound, or below half the distance
+    # from its center to the nearest other center, the point cannot change
+    # clusters and its distances are not computed.
+    #
+    # Assignments, ties included, and centers are exactly those of a plain
+    # Lloyd iteration that compares every point with every center: ties go
+    # to the first center and the cluster sums are accumulated in point
+    # order. regression.py checks this. The engine owns the points'
+    # assignments: they must not be changed between steps, except by
+    # clearing them. After each step, `changed` lists the points whose
+    # assignment changed, so callers can redraw just those.
+    #
+    # If `weights` is given, point i counts `weights[i]` times when the
+    # centers are computed, which is how weighted coresets are clustered.
+    # With `threads` above 1 on an interpreter without the GIL, the
+    # assignment runs on chunks of points in a thread pool; the cluster
+    # sums are then added per chunk, so centers can differ from a plain
+    # Lloyd iteration in the last bits. With the GIL it runs serially.
+    def __init__(self, points, weights=None, threads=1):
+        self.points = points
+        self.weights = weights
+        self.threads = threadpool.usable_threads(threads)
+        self.upper = array("d")
+        self.lower = array("d")
+        self.bound_centers = None
+        self.changed = []
+        self.num_distances = 0
+        self.skipped_fraction = 0.0
+
+    # Make room for points that were added since the last step. Their
+    # bounds force a full distance computation.
+    def grow(self):
+        missing = len(self.points) - len(self.upper)
+        if missing > 0:
+            self.upper.extend(array("d", [math.inf]) * missing)
+            self.lower.extend(array("d", [0.0]) * missing)
+
+    # Perform one Lloyd iteration. Points are assigned and the per-cluster
+    # sums accumulated in a single pass over the data. Return the new
+    # centers and the largest distance any center moved.
+    def step(self, centers):
+        self.grow()
+        k = len(centers)
+        points = self.points
+        indexed_centers = list(enumerate(centers))
+
+        # Half the distance from each center to its nearest other center.
+        half_gaps = []
+        for c, (cx, cy) in indexed_centers:
+            gap2 = min(
+                (
+                    kernels.sq_euclidean(cx, cy, ox, oy)
+                    for o, (ox, oy) in indexed_centers
+                    if o != c
+                ),
+                default=math.inf,
+            )
+            half_gaps.append(math.sqrt(gap2) / 2)
+
+        # How far the centers moved since the bounds were computed. A
+        # point's lower bound drops by the largest move of any center other
+        # than its own. If the number of centers changed, start afresh.
+        if self.bound_centers is None or len(self.bound_centers) != k:
+            self.upper = array("d", [math.inf]) * len(points)
+            self.lower = array("d", [0.0]) * len(points)
+            self.bound_centers = centers
+        moves = [
+            math.sqrt(kernels.sq_euclidean(nx, ny, cx, cy))
+            for (cx, cy), (nx, ny) in zip(self.bound_centers, centers)
+        ]
+        farthest = max(range(k), key=moves.__getitem__)
+        second_largest = max(
+            (move for c, move in enumerate(moves) if c != farthest), default=0.0
+        )
+
+        with metrics.phase("assignment"):
+            sum_xs, sum_ys, counts = self.assign(
+                centers, half_gaps, moves, farthest, second_largest
+            )
+
+        total = len(points) * k
+        self.skipped_fraction = 1 - self.num_distances / total if total else 0.0
+        metrics.count("distances", self.num_distances)
+        with metrics.phase("repositioning"):
+            return update_centers(centers, sum_xs, sum_ys, counts)
+
+    # Assign every point to its nearest center, using the bounds to skip
+    # distance computations where they can, and return the per-cluster
+    # coordinate sums and weights. With several threads the points are
+    # split into chunks that share the centers and bounds read-only and
+    # each write only their own assignments and bounds; the chunks' sums
+    # are then added in chunk order.
+    def assign(self, centers, half_gaps, moves, farthest, second_largest):
+        args = (centers, half_gaps, moves, farthest, second_largest)
+        count = len(self.points)
+        if self.threads <= 1:
+            results = [self.assign_range(0, count, *args)]
+        else:
+            results = threadpool.map_chunks(
+                lambda start, end: self.assign_range(start, end, *args),
+                count,
+                self.threads,
+            )
+
+        k = len(centers)
+        sum_xs = [0.0] * k
+        sum_ys = [0.0] * k
+        counts = [0] * k
+        changed = []
+        num_distances = 0
+        for chunk_xs, chunk_ys, chunk_counts, chunk_changed, chunk_distances in results:
+            for c in range(k):
+                sum_xs[c] += chunk_xs[c]
+                sum_ys[c] += chunk_ys[c]
+                counts[c] += chunk_counts[c]
+            changed.extend(chunk_changed)
+            num_distances += chunk_distances
+
+        self.bound_centers = centers
+        self.changed = changed
+        self.num_distances = num_distances
+        return sum_xs, sum_ys, counts
+
+    # Assign points start to end. Return their per-cluster sums and
+    # weights, the points that changed clusters and the number of distances
+    # computed.
+    def assign_range(
+        self, start, end, centers, half_gaps, moves, farthest, second_largest
+    ):
+        k = len(centers)
+        points = self.points
+        assignments = points.assignments
+        upper, lower = self.upper, self.lower
+        indexed_centers = list(enumerate(centers))
+        largest = moves[farthest]
+
+        sum_xs = [0.0] * k
+        sum_ys = [0.0] * k
+        counts = [0] * k
+        changed = []
+        num_distances = 0
+        keep = 1 - BOUND_TOLERANCE
+        xs = threadpool.view(points.xs, start, end)
+        ys = threadpool.view(points.ys, start, end)
+        if self.weights is None:
+            weights = repeat(1)
+        else:
+            weights = threadpool.view(self.weights, start, end)
+        for i, x, y, w in zip(range(start, end), xs, ys, weights):
+            a = assignments[i]
+            if 0 <= a < k:
+                u = upper[i] + moves[a]
+                low = lower[i] - (second_largest if a == farthest else largest)
+                bound = max(half_gaps[a], low)
+                if u >= bound * keep:
+                    # Tighten the upper bound and try again.
+                    cx, cy = centers[a]
+                    u = math.sqrt((x - cx) * (x - cx) + (y - cy) * (y - cy))
+                    num_distances += 1
+                upper[i] = u
+                lower[i] = low
+                if u < bound * keep:
+                    sum_xs[a] += w * x
+                    sum_ys[a] += w * y
+                    counts[a] += w
+                    continue
+
+            # Compare against every center.
+            best = 0
+            best_distance = math.inf
+            second_distance = math.inf
+            for c, (cx, cy) in indexed_centers:
+                d = (x - cx) * (x - cx) + (y - cy) * (y - cy)
+                if d < best_distance:
+                    best, best_distance, second_distance = c, d, best_distance
+                elif d < second_distance:
+                    second_distance = d
+            num_distances += k
+            if best != a:
+                assignments[i] = best
+                changed.append(i)
+            upper[i] = math.sqrt(best_distance)
+            lower[i] = math.sqrt(second_distance)
+            sum_xs[best] += w * x
+            sum_ys[best] += w * y
+            counts[best] += w
+
+        return sum_xs, sum_ys, counts, changed, num_distances
+
+
+# Return the sum of squared distances from the points to their assigned
+# centers, each multiplied by the point's weight if `weights` is given.
+def inertia(points, centers, weights=None):
+    metrics.count("distances", len(points))
+    total = 0.0
+    weights = repeat(1) if weights is None else weights
+    for x, y, c, w in zip(points.xs, points.ys, points.assignments, weights):
+        cx, cy = centers[c]
+        total += w * ((x - cx) * (x - cx) + (y - cy) * (y - cy))
+    return total
+
+
+# Return the index of the item that the cumulative `weights` reach at
+# `target`.
+def weighted_index(weights, target):
+    return min(bisect.bisect_right(list(accumulate(weights)), target), len(weights) - 1)
+
+
+# The seeding helpers below work on items by index, so k-modes can share
+# them: `to_many(i)` returns the distances from item i to every item,
+# which must be squared distances for D-squared sampling. For points that
+# is sq_euclidean_to_many(); for 0/1 glyphs the Hamming distance already
+# is one.
+
+
+# Return a one-to-many kernel over the points with coordinates xs and ys.
+def sq_euclidean_from(xs, ys):
+    return lambda i: kernels.sq_euclidean_to_many(xs[i], ys[i], xs, ys)
+
+
+# Return a kernel that, given the indices of some of the points, returns
+# every point's (position in `indices`, squared distance) of the nearest
+# of them, in one pass over the points.
+def sq_euclidean_nearest(xs, ys):
+    def nearest(indices):
+        centers = [(xs[i], ys[i]) for i in indices]
+        return [kernels.nearest_sq_euclidean(x, y, centers) for x, y in zip(xs, ys)]
+
+    return nearest
+
+
+# k-means++ seeding over `n` items: the first center is chosen uniformly
+# (or by weight), every next one with probability proportional to weight
+# times the distance to the nearest chosen center. Return the chosen
+# indices.
+def plus_plus(n, k, rng, to_many, weights=None):
+    if weights is None:
+        weights = [1] * n
+    first = weighted_index(weights, rng.random() * sum(weights))
+    distances = to_many(first)
+    metrics.count("distances", n)
+    return [first] + plus_plus_more(distances, k - 1, rng, to_many, weights)
+
+
+# Choose `count` more k-means++ centers and return their indices.
+# `distances` holds each item's distance to its nearest center so far.
+def plus_plus_more(distances, count, rng, to_many, weights):
+    n = len(distances)
+    chosen = []
+    while len(chosen) < count:
+        scores = [w * d for w, d in zip(weights, distances)]
+        total = sum(scores)
+        if total > 0:
+            i = weighted_index(scores, rng.random() * total)
+        else:
+            # Every item sits on a center already.
+            i = rng.randrange(n)
+        chosen.append(i)
+        distances = [d if d < e else e for d, e in zip(distances, to_many(i))]
+        metrics.count("distances", n)
+    return chosen
+
+
+# k-means|| seeding (Bahmani et al.). Instead of k sequential passes, each
+# of a few rounds samples about `oversampling` candidates at once, each
+# item with probability proportional to its distance to the nearest
+# candidate so far. `nearest(indices)` returns every item's (position,
+# distance) of the nearest of the given items, so each round makes one
+# pass over the data. Return the candidates' indices, at least k of them,
+# and their weights: how many items are closest to each, where weighted
+# items count `weights[i]` times in both the sampling and the weights.
+# Weighted k-means++ over the candidates then reduces them to k.
+def parallel_candidates(
+    n, k, rng, to_many, nearest, weights=None, rounds=5, oversampling=None
+):
+    if oversampling is None:
+        oversampling = 2 * k
+
+    if weights is None:
+        first = rng.randrange(n)
+        weights = [1] * n
+    else:
+        first = weighted_index(weights, rng.random() * sum(weights))
+    candidates = [first]
+    distances = to_many(first)
+    metrics.count("distances", n)
+    closest = [0] * n
+    for _ in range(rounds):
+        cost = sum(w * d for w, d in zip(weights, distances))
+        if cost == 0:
+            break
+        scale = oversampling / cost
+        new = [
+            i
+            for i, (w, d) in enumerate(zip(weights, distances))
+            if rng.random() < scale * w * d
+        ]
+        if not new:
+            continue
+        offset = len(candidates)
+        candidates.extend(new)
+        for j, (c, d) in enumerate(nearest(new)):
+            if d < distances[j]:
+                distances[j] = d
+                closest[j] = offset + c
+        metrics.count("distances", n * len(new))
+
+    # Make sure there are at least k candidates.
+    if len(candidates) < k:
+        chosen = set(candidates)
+        extra = [i for i in rng.sample(range(n), k) if i not in chosen]
+        candidates.extend(extra[: k - len(candidates)])
+
+    candidate_weights = [0] * len(candidates)
+    for c, w in zip(closest, weights):
+        candidate_weights[c] += w
+    return candidates, [max(w, 1) for w in candidate_weights]
+
+
+# Return `k` distinct points chosen uniformly at random as centers. Weights
+# are ignored: weighted points are already distinct positions.
+def random_seeds(points, k, rng, weights=None):
+    indices = rng.sample(range(len(points)), k=k)
+    return [(points.xs[i], points.ys[i]) for i in indices]
+
+
+# k-means++ seeding (D-squared sampling).
+def plus_plus_seeds(points, k, rng, weights=None):
+    xs, ys = points.xs, points.ys
+    chosen = plus_plus(len(xs), k, rng, sq_euclidean_from(xs, ys), weights)
+    return [(xs[i], ys[i]) for i in chosen]
+
+
+# Warm start: keep the given centers, for example those found for a
+# smaller k, and add k-means++ centers until there are k.
+def extend_seeds(points, centers, k, rng, weights=None):
+    xs, ys = points.xs, points.ys
+    if weights is None:
+        weights = [1] * len(xs)
+    distances = [kernels.nearest_sq_euclidean(x, y, centers)[1] for x, y in zip(xs, ys)]
+    metrics.count("distances", len(xs) * len(centers))
+    count = k - len(centers)
+    chosen = plus_plus_more(distances, count, rng, sq_euclidean_from(xs, ys), weights)
+    return list(centers) + [(xs[i], ys[i]) for i in chosen]
+
+
+# k-means|| seeding: oversample candidates, then reduce them to k with
+# weighted k-means++.
+def parallel_seeds(points, k, rng, weights=None, rounds=5, oversampling=None):
+    xs, ys = points.xs, points.ys
+    candidates, candidate_weights = parallel_candidates(
+        len(xs),
+        k,
+        rng,
+        sq_euclidean_from(xs, ys),
+        sq_euclidean_nearest(xs, ys),
+        weights,
+        rounds,
+        oversampling,
+    )
+    xs = [xs[i] for i in candidates]
+    ys = [ys[i] for i in candidates]
+    chosen = plus_plus(len(xs), k, rng, sq_euclidean_from(xs, ys), candidate_weights)
+    return [(xs[i], ys[i]) for i in chosen]
+
+
+# The available seeding strategies by name.
+SEEDINGS = {
+    "random": random_seeds,
+    "k-means++": plus_plus_seeds,
+    "k-means||": parallel_seeds,
+}
+
+
+# Return k initial centers using the named seeding strategy.
+def choose_seeds(points, k, method, rng, weights=None):
+    return SEEDINGS[method](points, k, rng, weights)
+
+
+class Engine:
+    # The iteration controls shared by KMeans and kmodes.KModes: a seeding
+    # method and RNG, and a stop distance and iteration limit. Subclasses
+    # implement seed(), which resets `iterations` and `shift`, and step(),
+    # which performs one iteration and sets `shift` to the largest
+    # distance any center moved.
+    def __init__(self, k, method, rng, stop_distance, max_iterations):
+        self.k = k
+        self.method = method
+        self.rng = rng or random.Random()
+        self.stop_distance = stop_distance
+        self.max_iterations = max_iterations
+        self.centers = None
+        self.iterations = 0
+        self.shift = math.inf
+
+    # Return True when the centers have stopped moving or the iteration
+    # limit has been reached.
+    def done(self):
+        if self.shift < self.stop_distance:
+            return True
+        return (
+            self.max_iterations is not None and self.iterations >= self.max_iterations
+        )
+
+    # Yield the engine after every iteration until it is done. At least
+    # one iteration is run, so a converged engine can be resumed after
+    # points were added.
+    def iterate(self):
+        while True:
+            self.step()
+            yield self
+            if self.done():
+                return
+
+    # Run to convergence. If a callback is given it is called with the
+    # engine after every `every`th iteration and after the last one.
+    # Return the engine.
+    def run(self, callback=None, every=1):
+        for model in self.iterate():
+            if callback is not None and (model.iterations % every == 0 or model.done()):
+                callback(model)
+        return self
+
+
+class KMeans(Engine):
+    # A headless k-means engine. It seeds the centers and runs Hamerly-
+    # accelerated Lloyd iterations at full speed, with no UI involved.
+    # Callers can step it by hand, consume iterate() as a generator, or
+    # call run() with a callback that sees every Nth iteration.
+    def __init__(
+        self,
+        points,
+        k,
+        method="k-means++",
+        rng=None,
+        stop_distance=1.0,
+        max_iterations=None,
+        weights=None,
+        threads=1,
+    ):
+        super().__init__(k, method, rng, stop_distance, max_iterations)
+        self.points = points
+        self.weights = weights
+        self.engine = Hamerly(points, weights, threads)
+
+    # Set the initial centers, choosing them with the seeding strategy if
+    # none are given, and forget any previous assignments.
+    def seed(self, centers=None):
+        if centers is None:
+            centers = choose_seeds(
+                self.points, self.k, self.method, self.rng, self.weights
+            )
+        self.centers = list(centers)
+        self.points.clear_assignments()
+        self.iterations = 0
+        self.shift = math.inf
+
+    # Perform one iteration. Return the largest distance any center moved.
+    def step(self):
+        if self.centers is None:
+            self.seed()
+        self.centers, self.shift = self.engine.step(self.centers)
+        self.iterations += 1
+        return self.shift
+
+    # Return the (weighted) sum of squared distances from the points to
+    # their centers.
+    def inertia(self):
+        return inertia(self.points, self.centers, self.weights)
@@ -0,0 +1,251 @@
+import argparse
+import math
+import random
+from array import array
+
+import datasets
+import kernels
+import kmeans
+import metrics
+from pointset import UNASSIGNED, GlyphSet
+
+
+# Add `bits` to a bit-sliced counter: bit j of counter[t] is bit t of the
+# count for bit position j, so one addition updates every position at once
+# with a few big-integer operations.
+def add_to_counter(counter, bits):
+    carry = bits
+    for t in range(len(counter)):
+        if carry == 0:
+            return
+        counter[t], carry = counter[t] ^ carry, counter[t] & carry
+    if carry:
+        counter.append(carry)
+
+
+# Return the bit positions whose count in a bit-sliced counter is greater
+# than `threshold`, and those where it is equal.
+def compare_counter(counter, threshold, all_ones):
+    if threshold >> len(counter):
+        return 0, 0
+    greater = 0
+    equal = all_ones
+    for t in reversed(range(len(counter))):
+        if (threshold >> t) & 1:
+            equal &= counter[t]
+        else:
+            greater |= equal & counter[t]
+            equal &= ~counter[t]
+    return greater, equal
+
+
+# Return the bitwise majority vote of a cluster's glyphs given their
+# bit-sliced counter and number. Tied bits keep the old center's value so
+# the centers settle. For binary data this is both the mode and the L1
+# median, so this is k-modes and k-medians at once.
+def majority(counter, size, old_center, all_ones):
+    greater, equal = compare_counter(counter, size // 2, all_ones)
+    if size % 2 == 1:
+        return greater
+    return greater | (equal & old_center)
+
+
+# Return `k` distinct glyphs chosen uniformly at random as centers.
+def random_seeds(glyphs, k, rng):
+    return [glyphs.bits[i] for i in rng.sample(range(len(glyphs)), k)]
+
+
+# Return a one-to-many kernel over a list of glyphs.
+def hamming_from(bits):
+    return lambda i: kernels.hamming_to_many(bits[i], bits)
+
+
+# Return a kernel that, given the indices of some of the glyphs, returns
+# every glyph's (position in `indices`, distance) of the nearest of them.
+def hamming_nearest(bits):
+    def nearest(indices):
+        centers = [bits[i] for i in indices]
+        return [kernels.nearest_hamming(b, centers) for b in bits]
+
+    return nearest
+
+
+# k-means++ seeding with Hamming distance, which for 0/1 vectors is the
+# squared Euclidean distance that D-squared sampling uses.
+def plus_plus_seeds(glyphs, k, rng):
+    bits = glyphs.bits
+    chosen = kmeans.plus_plus(len(bits), k, rng, hamming_from(bits))
+    return [bits[i] for i in chosen]
+
+
+# k-means|| seeding with Hamming distance.
+def parallel_seeds(glyphs, k, rng, rounds=5, oversampling=None):
+    bits = glyphs.bits
+    candidates, weights = kmeans.parallel_candidates(
+        len(bits),
+        k,
+        rng,
+        hamming_from(bits),
+        hamming_nearest(bits),
+        None,
+        rounds,
+        oversampling,
+    )
+    bits = [bits[i] for i in candidates]
+    chosen = kmeans.plus_plus(len(bits), k, rng, hamming_from(bits), weights)
+    return [bits[i] for i in chosen]
+
+
+# The seeding strategies, under the same names as kmeans.SEEDINGS.
+SEEDINGS = {
+    "random": random_seeds,
+    "k-means++": plus_plus_seeds,
+    "k-means||": parallel_seeds,
+}
+
+
+class KModes(kmeans.Engine):
+    # k-modes clustering of the packed glyphs of a GlyphSet. Glyphs are
+    # assigned to the nearest center by XOR popcount, and each center
+    # becomes the bitwise majority vote of its glyphs. The controls are
+    # those of kmeans.KMeans, where distances are in flipped bits. So the
+    # default stop distance of 1 runs until no center changes.
+    def __init__(
+        self,
+        glyphs,
+        k,
+        method="k-means++",
+        rng=None,
+        stop_distance=1.0,
+        max_iterations=None,
+    ):
+        super().__init__(k, method, rng, stop_distance, max_iterations)
+        self.glyphs = glyphs
+        self.all_ones = (1 << glyphs.num_features) - 1
+        self.assignments = array("i", [UNASSIGNED]) * len(glyphs)
+        self.changed = []
+
+    # Set the initial centers, choosing them with the seeding strategy if
+    # none are given, and forget any previous assignments.
+    def seed(self, centers=None):
+        if centers is None:
+            centers = SEEDINGS[self.method](self.glyphs, self.k, self.rng)
+        self.centers = list(centers)
+        self.assignments = array("i", [UNASSIGNED]) * len(self.glyphs)
+        self.iterations = 0
+        self.shift = math.inf
+
+    # Perform one iteration. Return the largest number of bits any center
+    # changed.
+    def step(self):
+        if self.centers is None:
+            self.seed()
+        k = len(self.centers)
+        counters = [[] for _ in range(k)]
+        sizes = [0] * k
+        changed = []
+        assignments = self.assignments
+        with metrics.phase("assignment"):
+            for i, bits in enumerate(self.glyphs.bits):
+                c, _ = kernels.nearest_hamming(bits, self.centers)
+                if c != assignments[i]:
+                    assignments[i] = c
+                    changed.append(i)
+                add_to_counter(counters[c], bits)
+                sizes[c] += 1
+        metrics.count("distances", len(self.glyphs) * k)
+
+        # Empty clusters keep their center.
+        with metrics.phase("repositioning"):
+            new_centers = [
+                majority(counter, size, center, self.all_ones) if size else center
+                for counter, size, center in zip(counters, sizes, self.centers)
+            ]
+        self.shift = max(
+            (old ^ new).bit_count() for old, new in zip(self.centers, new_centers)
+        )
+        self.centers = new_centers
+        self.changed = changed
+        self.iterations += 1
+        return self.shift
+
+    # Return the total Hamming distance from the glyphs to their centers.
+    def inertia(self):
+        return sum(
+            (bits ^ self.centers[c]).bit_count()
+            for bits, c in zip(self.glyphs.bits, self.assignments)
+        )
+
+
+# Print each center as a grid of cells with its cluster size and the
+# label most of its glyphs carry.
+def print_centers(model, cols):
+    glyphs = model.glyphs
+    num_bits = glyphs.num_features
+    votes = [{} for _ in model.centers]
+    for code, c in zip(glyphs.labels, model.assignments):
+        votes[c][code] = votes[c].get(code, 0) + 1
+    for c, center in enumerate(model.centers):
+        size = sum(votes[c].values())
+        print()
+        if size == 0:
+            print(f"Cluster {c}: empty")
+        else:
+            code = max(votes[c], key=votes[c].get)
+            purity = round(100 * votes[c][code] / size, 1)
+            print(
+                f"Cluster {c}: {size} glyphs, "
+                f"mostly {glyphs.names[code]} ({purity}%)"
+            )
+        text = format(center, f"0{num_bits}b")
+        for start in range(0, num_bits, cols):
+            print(text[start : start + cols].replace("0", ".").replace("1", "#"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="k-modes clustering of glyphs.")
+    parser.add_argument(
+        "source",
+        nargs="?",
+        default="resources/digit_data.txt",
+        help="glyphs in the digit_data text format or a .gly file",
+    )
+    parser.add_argument("-k", "--clusters", type=int, default=10)
+    parser.add_argument("--seeding", choices=list(SEEDINGS), default="k-means++")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    parser.add_argument("--max-iterations", type=int, default=None)
+    parser.add_argument("--cols", type=int, default=6, help="glyph grid width")
+    metrics.add_argument(parser)
+    args = parser.parse_args()
+    if args.max_iterations is not None and args.max_iterations < 1:
+        parser.error("--max-iterations must be at least 1")
+    metrics.configure(args)
+
+    with metrics.phase("load"):
+        if args.source.endswith(datasets.GLYPH_SUFFIX):
+            glyphs = datasets.read_glyphs(args.source)
+        else:
+            with open(args.source, "r") as f:
+                glyphs = GlyphSet.from_lines(f)
+
+    model = KModes(
+        glyphs,
+        args.clusters,
+        args.seeding,
+        random.Random(args.seed),
+        max_iterations=args.max_iterations,
+    )
+
+    def report(model):
+        print(
+            f"Iteration {model.iterations}: {len(model.changed)} glyphs changed, "
+            f"centers moved up to {model.shift} bits"
+        )
+
+    model.run(report)
+    print(f"{len(glyphs)} glyphs, cost {model.inertia()} bits")
+    print_centers(model, args.cols)
+
+
+if __name__ == "__main__":
+    main()
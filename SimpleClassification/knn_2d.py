@@ -1,6 +1,14 @@
-import math
+import argparse
+import random
 import tkinter as tk
 
+import datasets
+import metrics
+import profiling
+from accuracy import LeaveOneOut
+from pointset import PointSet
+from render import PointRenderer
+
 # Get the text in an Entry widget and
 # convert it to an int.
 
@@ -9,6 +17,12 @@ def get_int(entry):
     return int(entry.get())
 
 
+# Get the text in an Entry widget and
+# convert it to a float.
+def get_float(entry):
+    return float(entry.get())
+
+
 # Make Label and Entry widgets for a field.
 # Return the Entry widget.
 def make_field(parent, label_width, label_text, entry_width, entry_default):
@@ -25,44 +39,18 @@ def make_field(parent, label_width, label_text, entry_width, entry_default):
     return entry
 
 
-class DataPoint:
-    # Create a DataPoint at this spot.
-    def __init__(self, x, y, name):
-        self.name = name
-        self.x = x
-        self.y = y
-
-    # Return the distance between this point and another one.
-    def distance(self, other):
-        return math.sqrt(((self.x - other.x) ** 2) + ((self.y - other.y) ** 2))
-
-    # Use K nearest neighbors to set the data point's name.
-    def knn(self, data_points, k):
-        top_k_points = sorted(data_points, key=self.distance)[:k]
-        votes = {
-            "a": 0,
-            "b": 0,
-            "c": 0
-        }
-        for point in top_k_points:
-            votes[point.name] += 1
-
-        # Return the key with the highest number of votes. Note that this does
-        # not check for ties. If there is a tie, we simply get the first key
-        # found, I think.
-        self.name = max(votes, key=votes.get)
-
-    # Draw the data point.
-    def create_oval(self, canvas, bg_color):
-        radius = 8
-        canvas.create_oval(
-            self.x - radius,
-            self.y - radius,
-            self.x + radius,
-            self.y + radius,
-            fill=bg_color,
-        )
-        canvas.create_text(self.x, self.y, text=self.name)
+# Draw a highlighted data point as canvas items.
+def draw_point(canvas, x, y, name, bg_color):
+    radius = 8
+    canvas.create_oval(
+        x - radius,
+        y - radius,
+        x + radius,
+        y + radius,
+        fill=bg_color,
+    )
+    canvas.create_text(x, y, text=name)
+    metrics.count("canvas_ops", 2)
 
 
 # The main App class.
@@ -73,6 +61,13 @@ WINDOW_HGT = 300
 MARGIN = 5
 CANVAS_WID = WINDOW_WID - 200
 CANVAS_HGT = WINDOW_HGT - 2 * MARGIN
+POINT_RADIUS = 3
+
+# Cell size of the grid used to find neighbors for the accuracy readout.
+CELL_SIZE = 20
+
+# Colors for the labelled points, by label code.
+LABEL_COLORS = ["red", "blue", "green", "orange", "purple", "cyan", "magenta"]
 
 
 class App:
@@ -90,7 +85,12 @@ class App:
         self.build_ui()
 
         # Initially we have no data points.
-        self.data_points = []
+        self.data_points = PointSet()
+        self.tracker = None
+
+        # Agreement of approximate KNN with exact KNN so far.
+        self.num_approx = 0
+        self.num_agree = 0
 
         # Display the window.
         self.window.focus_force()
@@ -113,6 +113,9 @@ class App:
         self.canvas.pack(side=tk.LEFT, padx=MARGIN, pady=MARGIN)
         self.canvas.bind("<Button-1>", self.click)
 
+        # The labelled points are drawn in bulk as a single image.
+        self.renderer = PointRenderer(self.canvas, canvas_wid, canvas_hgt, POINT_RADIUS)
+
         # Right frame.
         right_frame = tk.Frame(self.window)
         right_frame.pack(side=tk.TOP, padx=MARGIN, pady=MARGIN)
@@ -123,29 +126,28 @@ class App:
         # Number of neighbors to check.
         self.num_neighbors_entry = make_field(right_frame, 10, "# Neighbors:", 3, "5")
 
-        # Test data set buttons.
-        button_frame = tk.Frame(right_frame, pady=MARGIN)
-        button_frame.pack(side=tk.TOP)
-        test1_button = tk.Button(
-            button_frame, text="Dataset 1", width=8, command=self.load_dataset_1
-        )
-        test1_button.pack(side=tk.LEFT)
-        test2_button = tk.Button(
-            button_frame, text="Dataset 2", width=8, command=self.load_dataset_2
-        )
-        test2_button.pack(side=tk.LEFT, padx=(MARGIN, 0))
-
-        # Test data set buttons.
-        button_frame = tk.Frame(right_frame, pady=MARGIN)
-        button_frame.pack(side=tk.TOP)
-        test3_button = tk.Button(
-            button_frame, text="Dataset 3", width=8, command=self.load_dataset_3
-        )
-        test3_button.pack(side=tk.LEFT)
-        test4_button = tk.Button(
-            button_frame, text="Dataset 4", width=8, command=self.load_dataset_4
-        )
-        test4_button.pack(side=tk.LEFT, padx=(MARGIN, 0))
+        # Approximate KNN settings. An epsilon of 0 and a cell budget of 0
+        # mean exact KNN.
+        self.epsilon_entry = make_field(right_frame, 10, "Epsilon:", 3, "0")
+        self.max_cells_entry = make_field(right_frame, 10, "Cell budget:", 3, "0")
+
+        # Label to display the leave-one-out accuracy of the labelled points.
+        self.accuracy_value = tk.StringVar()
+        accuracy_label = tk.Label(right_frame, textvariable=self.accuracy_value)
+        accuracy_label.pack(side=tk.TOP)
+
+        # Dataset buttons, two per row.
+        for i, name in enumerate(datasets.list_datasets()):
+            if i % 2 == 0:
+                button_frame = tk.Frame(right_frame, pady=MARGIN)
+                button_frame.pack(side=tk.TOP)
+            button = tk.Button(
+                button_frame,
+                text=name.replace("_", " ").capitalize(),
+                width=8,
+                command=lambda name=name: self.load_dataset(name),
+            )
+            button.pack(side=tk.LEFT, padx=(MARGIN if i % 2 else 0, 0))
 
         # Clear button.
         clear_button = tk.Button(right_frame, text="Clear", width=7, command=self.clear)
@@ -153,8 +155,30 @@ class App:
 
     # Clear existing points.
     def clear(self):
-        self.data_points = []
+        self.data_points = PointSet()
+        self.tracker = None
         self.canvas.delete("all")
+        self.renderer.reset()
+        self.accuracy_value.set("")
+
+    # Return the leave-one-out tracker for the current number of neighbors,
+    # rebuilding it if that number has changed.
+    def get_tracker(self):
+        k = get_int(self.num_neighbors_entry)
+        if self.tracker is None or self.tracker.k != k:
+            self.tracker = LeaveOneOut(self.data_points, k, CELL_SIZE)
+        return self.tracker
+
+    # Display the leave-one-out accuracy.
+    def show_accuracy(self):
+        tracker = self.get_tracker()
+        self.accuracy_value.set(
+            f"LOO accuracy: {round(tracker.accuracy(), 1)}% (K = {tracker.k})"
+        )
+
+    # Return the color of a label code.
+    def label_color(self, code):
+        return LABEL_COLORS[code % len(LABEL_COLORS)]
 
     # Save and draw a data point.
     def click(self, event):
@@ -163,8 +187,6 @@ class App:
         self.make_data_point(event.x, event.y, name)
 
     def make_data_point(self, x, y, name):
-        data_point = DataPoint(x, y, name)
-
         # If it has no name, use KNN to assign one.
         if name == "":
             # If there are no points defined yet, do nothing.
@@ -175,255 +197,125 @@ class App:
             k = get_int(self.num_neighbors_entry)
 
             # Use KNN to assign a name to the point.
-            data_point.knn(self.data_points, k)
+            epsilon = get_float(self.epsilon_entry)
+            max_cells = get_int(self.max_cells_entry)
+            with profiling.section():
+                if epsilon > 0 or max_cells > 0:
+                    name = self.approx_knn(x, y, k, epsilon, max_cells or None)
+                else:
+                    name = self.data_points.knn(x, y, k)
 
             # Draw with a pink background.
-            data_point.create_oval(self.canvas, "pink")
+            draw_point(self.canvas, x, y, name, "pink")
         else:
-            # Draw with a white background.
-            data_point.create_oval(self.canvas, "white")
-
-            # Save this point to use later as a neighbor.
-            self.data_points.append(data_point)
-
-    def kill_callback(self):
-        self.window.destroy()
+            # Save this point to use later as a neighbor. The tracker only
+            # updates the points that get it as a new neighbor.
+            with profiling.section():
+                self.get_tracker().add(x, y, name)
+            self.show_accuracy()
+            i = len(self.data_points) - 1
+
+            # Draw it in its label's color.
+            self.renderer.draw_point(x, y, self.label_color(self.data_points.labels[i]))
+            self.renderer.blit()
+
+    # Use approximate KNN to predict a point's name, and report how often
+    # it has agreed with exact KNN.
+    def approx_knn(self, x, y, k, epsilon, max_cells):
+        index = self.get_tracker().index
+        neighbors, guaranteed = index.approx_nearest(x, y, k, epsilon, max_cells)
+        name = self.data_points.vote(i for _, i in neighbors)
+        exact_name = self.data_points.knn(x, y, k)
+
+        self.num_approx += 1
+        self.num_agree += name == exact_name
+        agreement = round(100 * self.num_agree / self.num_approx, 1)
+        bound = f"1+{epsilon}" if guaranteed else "none (budget hit)"
+        print(
+            f"Approximate: {name}, exact: {exact_name}, bound: {bound}, "
+            f"agreement: {agreement}% of {self.num_approx}"
+        )
+        return name
 
-    def load_dataset_1(self):
+    # Replace the current points with a registered dataset.
+    def load_dataset(self, name):
         self.clear()
-        self.data_points = [
-            DataPoint(62, 80, "a"),
-            DataPoint(82, 58, "a"),
-            DataPoint(95, 91, "a"),
-            DataPoint(111, 54, "a"),
-            DataPoint(80, 82, "a"),
-            DataPoint(136, 86, "a"),
-            DataPoint(121, 108, "a"),
-            DataPoint(106, 75, "a"),
-            DataPoint(96, 105, "a"),
-            DataPoint(67, 124, "a"),
-            DataPoint(63, 100, "a"),
-            DataPoint(165, 217, "c"),
-            DataPoint(166, 198, "c"),
-            DataPoint(193, 219, "c"),
-            DataPoint(225, 237, "c"),
-            DataPoint(207, 248, "c"),
-            DataPoint(171, 260, "c"),
-            DataPoint(150, 234, "c"),
-            DataPoint(184, 240, "c"),
-            DataPoint(184, 264, "c"),
-            DataPoint(176, 222, "c"),
-            DataPoint(194, 199, "c"),
-            DataPoint(212, 216, "c"),
-            DataPoint(240, 98, "b"),
-            DataPoint(215, 101, "b"),
-            DataPoint(220, 129, "b"),
-            DataPoint(223, 113, "b"),
-            DataPoint(242, 122, "b"),
-            DataPoint(253, 113, "b"),
-            DataPoint(244, 85, "b"),
-            DataPoint(219, 72, "b"),
-            DataPoint(235, 144, "b"),
-            DataPoint(266, 131, "b"),
-            DataPoint(259, 92, "b"),
-            DataPoint(205, 119, "b"),
-        ]
-        for point in self.data_points:
-            point.create_oval(self.canvas, "white")
+        with profiling.section():
+            with metrics.phase("load"):
+                self.data_points = datasets.load_dataset(name)
+            self.get_tracker()
+        points = self.data_points
+        colors = [self.label_color(code) for code in range(len(points.names))]
+        self.renderer.draw_points(points.xs, points.ys, points.labels, colors, "black")
+        self.show_accuracy()
         self.cluster_entry.delete(0, tk.END)
         self.cluster_entry.insert(tk.END, "")
 
-    def load_dataset_2(self):
-        self.clear()
-        self.data_points = [
-            DataPoint(198, 69, "a"),
-            DataPoint(215, 75, "a"),
-            DataPoint(213, 99, "a"),
-            DataPoint(220, 127, "a"),
-            DataPoint(211, 149, "a"),
-            DataPoint(63, 192, "a"),
-            DataPoint(92, 208, "a"),
-            DataPoint(164, 209, "a"),
-            DataPoint(91, 68, "a"),
-            DataPoint(54, 107, "a"),
-            DataPoint(50, 134, "a"),
-            DataPoint(136, 59, "a"),
-            DataPoint(174, 58, "a"),
-            DataPoint(212, 191, "a"),
-            DataPoint(202, 170, "a"),
-            DataPoint(192, 194, "a"),
-            DataPoint(167, 192, "a"),
-            DataPoint(143, 192, "a"),
-            DataPoint(129, 209, "a"),
-            DataPoint(142, 225, "a"),
-            DataPoint(101, 228, "a"),
-            DataPoint(99, 189, "a"),
-            DataPoint(72, 220, "a"),
-            DataPoint(45, 181, "a"),
-            DataPoint(70, 179, "a"),
-            DataPoint(55, 160, "a"),
-            DataPoint(36, 160, "a"),
-            DataPoint(36, 140, "a"),
-            DataPoint(45, 150, "a"),
-            DataPoint(42, 113, "a"),
-            DataPoint(60, 68, "a"),
-            DataPoint(59, 88, "a"),
-            DataPoint(99, 56, "a"),
-            DataPoint(82, 93, "a"),
-            DataPoint(127, 36, "a"),
-            DataPoint(151, 53, "a"),
-            DataPoint(150, 20, "a"),
-            DataPoint(124, 48, "a"),
-            DataPoint(200, 48, "a"),
-            DataPoint(180, 40, "a"),
-            DataPoint(166, 35, "a"),
-            DataPoint(224, 96, "a"),
-            DataPoint(240, 136, "a"),
-            DataPoint(238, 115, "a"),
-            DataPoint(230, 114, "a"),
-            DataPoint(223, 133, "a"),
-            DataPoint(231, 158, "a"),
-            DataPoint(216, 177, "a"),
-            DataPoint(206, 176, "a"),
-            DataPoint(183, 179, "a"),
-            DataPoint(195, 212, "a"),
-            DataPoint(138, 127, "b"),
-            DataPoint(133, 114, "b"),
-            DataPoint(155, 114, "b"),
-            DataPoint(151, 131, "b"),
-            DataPoint(145, 120, "b"),
-            DataPoint(142, 142, "b"),
-            DataPoint(131, 133, "b"),
-            DataPoint(125, 123, "b"),
-            DataPoint(124, 144, "b"),
-        ]
-        for point in self.data_points:
-            point.create_oval(self.canvas, "white")
-        self.cluster_entry.delete(0, tk.END)
-        self.cluster_entry.insert(tk.END, "")
+    def kill_callback(self):
+        self.window.destroy()
 
-    def load_dataset_3(self):
-        self.clear()
-        self.data_points = [
-            DataPoint(100, 87, "a"),
-            DataPoint(92, 62, "a"),
-            DataPoint(74, 84, "a"),
-            DataPoint(123, 75, "a"),
-            DataPoint(140, 76, "a"),
-            DataPoint(174, 76, "a"),
-            DataPoint(202, 77, "a"),
-            DataPoint(190, 60, "a"),
-            DataPoint(155, 67, "a"),
-            DataPoint(189, 83, "a"),
-            DataPoint(218, 113, "a"),
-            DataPoint(207, 97, "a"),
-            DataPoint(233, 85, "a"),
-            DataPoint(230, 100, "a"),
-            DataPoint(193, 116, "a"),
-            DataPoint(187, 128, "a"),
-            DataPoint(179, 114, "a"),
-            DataPoint(199, 123, "a"),
-            DataPoint(173, 142, "a"),
-            DataPoint(167, 133, "a"),
-            DataPoint(167, 160, "a"),
-            DataPoint(156, 161, "a"),
-            DataPoint(157, 145, "a"),
-            DataPoint(113, 172, "a"),
-            DataPoint(135, 153, "a"),
-            DataPoint(140, 169, "a"),
-            DataPoint(126, 164, "a"),
-            DataPoint(90, 188, "a"),
-            DataPoint(103, 191, "a"),
-            DataPoint(115, 187, "a"),
-            DataPoint(129, 195, "a"),
-            DataPoint(129, 176, "a"),
-            DataPoint(103, 195, "a"),
-            DataPoint(86, 221, "a"),
-            DataPoint(69, 212, "a"),
-            DataPoint(67, 228, "a"),
-            DataPoint(83, 238, "a"),
-            DataPoint(107, 212, "a"),
-            DataPoint(106, 235, "a"),
-            DataPoint(139, 259, "a"),
-            DataPoint(124, 253, "a"),
-            DataPoint(117, 253, "a"),
-            DataPoint(125, 240, "a"),
-            DataPoint(183, 253, "a"),
-            DataPoint(207, 228, "a"),
-            DataPoint(207, 231, "a"),
-            DataPoint(209, 244, "a"),
-            DataPoint(202, 240, "a"),
-            DataPoint(199, 256, "a"),
-            DataPoint(182, 238, "a"),
-            DataPoint(169, 248, "a"),
-            DataPoint(147, 241, "a"),
-            DataPoint(151, 258, "a"),
-            DataPoint(170, 260, "a"),
-            DataPoint(95, 76, "a"),
-            DataPoint(114, 74, "a"),
-            DataPoint(114, 74, "a"),
-            DataPoint(114, 74, "a"),
-            DataPoint(118, 57, "a"),
-            DataPoint(145, 57, "a"),
-            DataPoint(64, 130, "b"),
-            DataPoint(64, 143, "b"),
-            DataPoint(50, 137, "b"),
-            DataPoint(51, 123, "b"),
-            DataPoint(48, 157, "b"),
-            DataPoint(43, 152, "b"),
-            DataPoint(59, 152, "b"),
-            DataPoint(37, 135, "b"),
-            DataPoint(218, 163, "c"),
-            DataPoint(220, 169, "c"),
-            DataPoint(235, 173, "c"),
-            DataPoint(223, 152, "c"),
-            DataPoint(248, 152, "c"),
-            DataPoint(227, 164, "c"),
-            DataPoint(247, 176, "c"),
-            DataPoint(239, 155, "c"),
-            DataPoint(239, 189, "c"),
-            DataPoint(227, 179, "c"),
-            DataPoint(211, 180, "c"),
-        ]
-        for point in self.data_points:
-            point.create_oval(self.canvas, "white")
-        self.cluster_entry.delete(0, tk.END)
-        self.cluster_entry.insert(tk.END, "")
 
-    def load_dataset_4(self):
-        self.clear()
-        self.data_points = [
-            DataPoint(139, 31, "a"),
-            DataPoint(127, 60, "a"),
-            DataPoint(137, 117, "a"),
-            DataPoint(137, 160, "a"),
-            DataPoint(147, 120, "a"),
-            DataPoint(115, 96, "a"),
-            DataPoint(141, 90, "a"),
-            DataPoint(152, 60, "a"),
-            DataPoint(156, 112, "a"),
-            DataPoint(123, 74, "a"),
-            DataPoint(68, 241, "b"),
-            DataPoint(80, 228, "b"),
-            DataPoint(115, 249, "b"),
-            DataPoint(135, 240, "b"),
-            DataPoint(155, 219, "b"),
-            DataPoint(169, 242, "b"),
-            DataPoint(193, 248, "b"),
-            DataPoint(120, 219, "b"),
-            DataPoint(155, 255, "b"),
-            DataPoint(211, 229, "b"),
-            DataPoint(190, 221, "b"),
-            DataPoint(245, 232, "b"),
+# Load a dataset, report its leave-one-out accuracy and classify random
+# query points without the GUI.
+def run_headless(args):
+    rng = random.Random(args.seed)
+    with profiling.section():
+        with metrics.phase("load"):
+            points = datasets.load_path(args.headless)
+        tracker = LeaveOneOut(points, args.neighbors, CELL_SIZE)
+        print(
+            f"{len(points)} points, LOO accuracy {round(tracker.accuracy(), 1)}% "
+            f"(K = {args.neighbors})"
+        )
+
+        queries = [
+            (rng.uniform(0, CANVAS_WID), rng.uniform(0, CANVAS_HGT))
+            for _ in range(args.queries)
         ]
-        for point in self.data_points:
-            point.create_oval(self.canvas, "white")
-        self.cluster_entry.delete(0, tk.END)
-        self.cluster_entry.insert(tk.END, "")
+        if args.epsilon > 0 or args.max_cells > 0:
+            agreement, worst_ratio, guaranteed = tracker.index.measure_agreement(
+                queries, args.neighbors, args.epsilon, args.max_cells or None
+            )
+            print(
+                f"{args.queries} approximate queries: {round(100 * agreement, 1)}% "
+                f"agree with exact KNN, worst distance ratio "
+                f"{round(worst_ratio, 3)}, {round(100 * guaranteed, 1)}% guaranteed"
+            )
+        else:
+            votes = {}
+            for x, y in queries:
+                name = points.knn(x, y, args.neighbors)
+                votes[name] = votes.get(name, 0) + 1
+            print(f"{args.queries} queries: {votes}")
 
 
 def main():
-    App()
+    parser = argparse.ArgumentParser(description="KNN classification of 2D points.")
+    parser.add_argument(
+        "--headless",
+        metavar="DATASET",
+        help="classify with a dataset name or .txt/.pts file without the GUI",
+    )
+    parser.add_argument("-k", "--neighbors", type=int, default=5)
+    parser.add_argument(
+        "--queries", type=int, default=1000, help="random points to classify"
+    )
+    parser.add_argument(
+        "--epsilon", type=float, default=0.0, help="approximation slack"
+    )
+    parser.add_argument(
+        "--max-cells", type=int, default=0, help="grid cells searched per query"
+    )
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    metrics.add_argument(parser)
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    metrics.configure(args)
+    profiling.configure(args)
+    if args.headless is None:
+        App()
+    else:
+        run_headless(args)
 
 
 if __name__ == "__main__":
@@ -1,45 +1,19 @@
-import math
+import argparse
 import tkinter as tk
 
+import metrics
+import profiling
+import threadpool
+from pointset import GlyphSet
 
-class DataPoint:
-    # The data_string parameter is a string holding the digit, 0s, and 1s
-    # in the format '6: 011110110000100000111111110001110001010001001111'
-    def __init__(self, data_string):
-        # Initialize the name and os and 1s.
-        fields = data_string.split(" ")
-        self.name = fields[0][0]
-        self.zeros_and_ones = fields[1].strip()
-
-        # Add the 0s and 1s to a list of ints.
-        self.properties = []
-        for ch in self.zeros_and_ones:
-            self.properties.append(int(ch))
-
-    # Calculate the distance from this point to the other point.
-    def distance(self, other):
-        return math.sqrt(
-            sum([(i - j) ** 2 for i, j in zip(self.properties, other.properties)])
-        )
-
-    # Use K nearest neighbors to predict the data point's name.
-    def predict(self, data_points, k):
-        top_k_points = sorted(data_points, key=self.distance)[:k]
-        votes = {}
-        for point in top_k_points:
-            votes[point.name] = votes.get(point.name, 0) + 1
-
-        # Return the key with the highest number of votes. Note that this does
-        # not check for ties. If there is a tie, we simply get the first key
-        # found, I think.
-        return max(votes, key=votes.get)
-
-    # Use =predict()= to set the data point's name.
-    def knn(self, data_points, k):
-        self.name = self.predict(data_points, k)
+# The main App class.
 
+# Test glyphs scored per thread-pool task. Each one scans every glyph.
+TEST_CHUNK_SIZE = 16
 
-# The main App class.
+# The range of K values tried.
+MIN_K = 3
+MAX_K = 20
 
 # Geometry constants.
 NUM_ROWS = 8
@@ -53,8 +27,9 @@ WINDOW_HGT = NUM_ROWS * CELL_HGT + 40
 
 class App:
     # Create and manage the tkinter interface.
-    def __init__(self):
+    def __init__(self, threads=1):
         self.network = None
+        self.threads = threads
 
         # Make the main interface.
         self.window = tk.Tk()
@@ -68,8 +43,8 @@ class App:
         # Load the data.
         self.load_data()
 
-        # Test K values between 3 and 20.
-        self.test_ks(3, 20)
+        # Test K values between MIN_K and MAX_K.
+        self.test_ks(MIN_K, MAX_K)
 
         # Test one more time with the best K to display the result.
         self.test_data(self.k)
@@ -131,36 +106,21 @@ class App:
 
     # Load the data points.
     def load_data(self):
-        with open("resources/digit_data.txt", "r") as f:
-            lines = f.readlines()
-            self.data_points = []
-            for line in lines:
-                self.data_points.append(DataPoint(line))
+        with profiling.section():
+            self.data_points = load_glyphs()
 
     # Test different values for K.
     def test_ks(self, min_k, max_k):
-        best = (0, 0.0)
-        for k in range(min_k, max_k + 1):
-            result = self.test_data(k)
-            if result > best[1]:
-                best = (k, result)
-        print(f"Final K: {best[0]}")
-        self.k = best[0]
+        with profiling.section():
+            self.k = best_k(self.data_points, min_k, max_k, self.threads)
 
     # Test each of the data points with this value for K.
     # Return the success rate.
     def test_data(self, k):
-        num_successes = 0
-        for data_point in self.data_points:
-            prediction = data_point.predict(self.data_points, k)
-            if prediction == data_point.name:
-                num_successes += 1
-
-        # Print the results.
-        success_rate = round(100 * num_successes / len(self.data_points), 1)
-        self.success_rate_value.set(f"K = {k}, success rate: {success_rate}%")
-        print(f"K = {k}, Success Rate = {success_rate}%")
-        return success_rate
+        with profiling.section():
+            rate = success_rate(self.data_points, k, self.threads)
+        self.success_rate_value.set(f"K = {k}, success rate: {rate}%")
+        return rate
 
     # The user has moved the mouse while drawing.
     # Remove the existing polyline and draw a new one.
@@ -168,10 +128,12 @@ class App:
         # Remove old polyline.
         self.canvas.delete(self.polyline)
         self.polyline = None
+        metrics.count("canvas_ops")
 
         # Draw current points.
         if len(self.points) > 1:
             self.polyline = self.canvas.create_line(self.points, fill="black")
+            metrics.count("canvas_ops")
 
     # The user has pressed the mouse down over the canvas.
     # Start drawing.
@@ -198,29 +160,27 @@ class App:
 
     # Use KNN to see which digit this may be.
     def evaluate_polyline(self):
-        # Convert the polyline into a DataPoint.
-        data_point = self.polyline_to_data_point()
+        # Convert the polyline into packed glyph bits.
+        bits = self.polyline_to_bits()
 
-        # Use KNN to give it a new name.
-        data_point.knn(self.data_points, self.k)
+        # Use KNN to give it a name.
+        with profiling.section():
+            name = self.data_points.predict(bits, self.k)
 
         # Display the result.
-        self.user_result_value.set(data_point.name)
-        print(f"Digit: {data_point.name}")
+        self.user_result_value.set(name)
+        print(f"Digit: {name}")
 
-    # Convert the polyline into a DataPoint.
-    def polyline_to_data_point(self):
+    # Convert the polyline into packed glyph bits.
+    def polyline_to_bits(self):
         # Convert the points into the cells that were touched.
         touched = self.get_touched()
 
         # Convert the touched cells to a string.
         touched_string = self.touched_to_string(touched)
 
-        # Compose the DataPoint data string.
-        data_string = f"?: {touched_string}"
-
-        # Create the DataPoint.
-        return DataPoint(data_string)
+        # Pack the string.
+        return GlyphSet.pack(touched_string)
 
     # Convert the points in the polyline into the cells that were touched.
     def get_touched(self):
@@ -240,7 +200,7 @@ class App:
         return touched
 
     # Return a string holding the touch values so
-    # we can use it to initialize a DataPoint object.
+    # we can pack it into glyph bits.
     def touched_to_string(self, touched):
         result = ""
         for r in range(NUM_ROWS):
@@ -252,8 +212,72 @@ class App:
         self.window.destroy()
 
 
+# Load the digit glyphs.
+def load_glyphs():
+    with metrics.phase("load"), open("resources/digit_data.txt", "r") as f:
+        return GlyphSet.from_lines(f)
+
+
+# Test each of the glyphs with this value for K and print the result.
+# Return the success rate.
+def success_rate(glyphs, k, threads=1):
+    # Score a chunk of the glyphs. The threads share the glyph set.
+    def count_successes(start, end):
+        num_successes = 0
+        for i in range(start, end):
+            prediction = glyphs.predict(glyphs.bits[i], k)
+            if prediction == glyphs.name(i):
+                num_successes += 1
+        return num_successes
+
+    num_successes = sum(
+        threadpool.map_chunks(count_successes, len(glyphs), threads, TEST_CHUNK_SIZE)
+    )
+
+    # Print the results.
+    rate = round(100 * num_successes / len(glyphs), 1)
+    print(f"K = {k}, Success Rate = {rate}%")
+    metrics.log("test_data", k=k, success_rate=rate)
+    return rate
+
+
+# Test K values between min_k and max_k and return the best one.
+def best_k(glyphs, min_k, max_k, threads=1):
+    best = (0, 0.0)
+    with metrics.phase("k_search"):
+        for k in range(min_k, max_k + 1):
+            result = success_rate(glyphs, k, threads)
+            if result > best[1]:
+                best = (k, result)
+    print(f"Final K: {best[0]}")
+    return best[0]
+
+
+# Load the glyphs and search for the best K without the GUI.
+def run_headless(args):
+    with profiling.section():
+        glyphs = load_glyphs()
+        best_k(glyphs, MIN_K, MAX_K, args.threads)
+
+
 def main():
-    App()
+    parser = argparse.ArgumentParser(description="KNN recognition of drawn digits.")
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="search for the best K without the GUI",
+    )
+    threadpool.add_argument(parser)
+    metrics.add_argument(parser)
+    profiling.add_argument(parser)
+    args = parser.parse_args()
+    metrics.configure(args)
+    profiling.configure(args)
+    threadpool.check(args.threads)
+    if args.headless:
+        run_headless(args)
+    else:
+        App(args.threads)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,102 @@
+import atexit
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Lightweight instrumentation shared by the apps. Code counts events such
+# as distance evaluations, sorts and canvas operations with count(), times
+# phases such as loading and assignment with `with phase(name):`, and
+# records structured events with log(). Everything is off until enable()
+# is called; then a JSON report is written to the sink when the program
+# exits. Counters are bumped once per batch, not once per distance, so a
+# disabled layer costs a function call per batch. Work done in worker
+# threads is counted; work done in worker processes is not.
+enabled = False
+sink = None
+counters = {}
+counters_lock = threading.Lock()
+phases = {}
+events = []
+
+# What phase() returns while disabled.
+NO_PHASE = nullcontext()
+
+
+# Turn metrics on and write the report to `path` at exit. "-" means
+# standard error.
+def enable(path):
+    global enabled, sink
+    enabled = True
+    sink = path
+    atexit.register(write)
+
+
+# Add `amount` to a counter.
+def count(name, amount=1):
+    if enabled:
+        with counters_lock:
+            counters[name] = counters.get(name, 0) + amount
+
+
+# Return a context manager that times a phase. Phases may nest; each one
+# adds its own calls and seconds.
+def phase(name):
+    if not enabled:
+        return NO_PHASE
+    return timed_phase(name)
+
+
+@contextmanager
+def timed_phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        entry = phases.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += time.perf_counter() - start
+
+
+# Record a structured event, such as the end of a k-means tick.
+def log(event, **fields):
+    if enabled:
+        events.append({"event": event, "time": time.time(), **fields})
+
+
+# Return everything recorded so far as a JSON-ready dict.
+def report():
+    return {
+        "counters": dict(counters),
+        "phases": {
+            name: {"calls": calls, "seconds": seconds}
+            for name, (calls, seconds) in phases.items()
+        },
+        "events": list(events),
+    }
+
+
+# Write the report to the sink.
+def write():
+    if sink == "-":
+        json.dump(report(), sys.stderr, indent=2)
+        sys.stderr.write("\n")
+    else:
+        with open(sink, "w") as f:
+            json.dump(report(), f, indent=2)
+
+
+# Add the --metrics option to an argument parser.
+def add_argument(parser):
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="write counters and phase timings as JSON to FILE (- for stderr)",
+    )
+
+
+# Enable metrics if the parsed arguments ask for them.
+def configure(args):
+    if args.metrics:
+        enable(args.metrics)
@@ -0,0 +1,145 @@
+import argparse
+import math
+import random
+
+import datasets
+import kernels
+
+
+class MiniBatchKMeans:
+    # Mini-batch k-means for point streams that do not fit in memory. Points
+    # arrive in fixed-size batches of (x, y) tuples. Each batch is assigned
+    # to the current centers, then every center is pulled toward its points
+    # with a per-center learning rate of 1 / (points seen by that center).
+    # Memory use is the k centers plus one batch.
+    def __init__(self, k, rng=None):
+        self.k = k
+        self.rng = rng or random.Random()
+        self.centers = []
+        self.counts = []
+        self.num_batches = 0
+
+    # Return the index of the center nearest to (x, y) and the squared
+    # distance to it.
+    def nearest(self, x, y):
+        return kernels.nearest_sq_euclidean(x, y, self.centers)
+
+    # Update the centers with one batch of points.
+    # Return the largest distance any center moved.
+    def partial_fit(self, batch):
+        # The first points seen become the initial centers.
+        if len(self.centers) < self.k:
+            needed = self.k - len(self.centers)
+            chosen = self.rng.sample(batch, min(needed, len(batch)))
+            self.centers.extend(chosen)
+            self.counts.extend([0] * len(chosen))
+            if len(self.centers) < self.k:
+                return math.inf
+
+        # Assign the whole batch first so every point sees the same centers.
+        old_centers = list(self.centers)
+        nearest = [self.nearest(x, y)[0] for x, y in batch]
+        centers, counts = self.centers, self.counts
+        for (x, y), c in zip(batch, nearest):
+            counts[c] += 1
+            rate = 1 / counts[c]
+            cx, cy = centers[c]
+            centers[c] = (cx + rate * (x - cx), cy + rate * (y - cy))
+        self.num_batches += 1
+
+        return math.sqrt(
+            max(
+                kernels.sq_euclidean(nx, ny, ox, oy)
+                for (ox, oy), (nx, ny) in zip(old_centers, centers)
+            )
+        )
+
+    # Make one pass over a (possibly unbounded) iterable of batches,
+    # stopping after `max_batches` if it is given.
+    def fit_stream(self, batches, max_batches=None):
+        for i, batch in enumerate(batches):
+            if max_batches is not None and i >= max_batches:
+                break
+            self.partial_fit(batch)
+        return self
+
+    # Make repeated passes over a finite source. `open_batches` must return
+    # a fresh iterable of batches on each call, for example by re-reading
+    # a file. Stop early when no center moves more than `tolerance` during
+    # a whole epoch. Return the number of epochs run.
+    def fit_epochs(self, open_batches, epochs, tolerance=0.0):
+        for epoch in range(1, epochs + 1):
+            start = list(self.centers)
+            self.fit_stream(open_batches())
+            if len(start) == self.k:
+                moved = math.sqrt(
+                    max(
+                        kernels.sq_euclidean(nx, ny, ox, oy)
+                        for (ox, oy), (nx, ny) in zip(start, self.centers)
+                    )
+                )
+                if moved <= tolerance:
+                    break
+        return epoch
+
+    # Final full-assignment pass. Yield each batch's list of center indices
+    # and add up the inertia (sum of squared distances) in self.inertia.
+    def assign(self, batches):
+        self.inertia = 0.0
+        for batch in batches:
+            labels = []
+            for x, y in batch:
+                c, d = self.nearest(x, y)
+                labels.append(c)
+                self.inertia += d
+            yield labels
+
+
+# Run mini-batch k-means on a dataset file or a registered dataset name.
+def main():
+    parser = argparse.ArgumentParser(description="Mini-batch streaming k-means.")
+    parser.add_argument(
+        "source", help="dataset name, .txt or .pts file, or - for standard input"
+    )
+    parser.add_argument("-k", "--clusters", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--max-batches", type=int, default=None)
+    parser.add_argument("--tolerance", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--assign", metavar="FILE", help="write each point's cluster to FILE"
+    )
+    args = parser.parse_args()
+
+    path = args.source
+    if path != "-" and not (path.endswith(".txt") or path.endswith(".pts")):
+        path = datasets.dataset_path(path)
+    if path == "-" and (args.epochs > 1 or args.assign):
+        parser.error("standard input can only be read once")
+
+    model = MiniBatchKMeans(args.clusters, random.Random(args.seed))
+    if args.epochs > 1:
+        model.fit_epochs(
+            lambda: datasets.stream_batches(path, args.batch_size),
+            args.epochs,
+            args.tolerance,
+        )
+    else:
+        model.fit_stream(
+            datasets.stream_batches(path, args.batch_size), args.max_batches
+        )
+    print(f"Batches: {model.num_batches}")
+    for (x, y), count in zip(model.centers, model.counts):
+        print(f"Center ({x:.2f}, {y:.2f}), {count} points")
+
+    if args.assign:
+        with open(args.assign, "w") as f:
+            batches = datasets.stream_batches(path, args.batch_size)
+            for labels in model.assign(batches):
+                f.write("".join(f"{label}\n" for label in labels))
+        print(f"Inertia: {model.inertia:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import heapq
+from array import array
+
+import kernels
+import metrics
+
+# Label and assignment value for points that have none.
+UNASSIGNED = -1
+
+
+class PointSet:
+    # A compact, array-backed collection of 2D points. Coordinates, label
+    # codes and cluster assignments are each stored in a contiguous array,
+    # so a point costs 24 bytes instead of a full object with an instance
+    # dict. Label codes index into `names`.
+    def __init__(self):
+        self.xs = array("d")
+        self.ys = array("d")
+        self.labels = array("i")
+        self.assignments = array("i")
+        self.names = []
+        self.codes = {}
+        self.norms = array("d")
+
+    def __len__(self):
+        return len(self.xs)
+
+    # Return the code for a label name, registering the name if it is new.
+    # An empty name or None means the point has no label.
+    def label_code(self, name):
+        if not name:
+            return UNASSIGNED
+        code = self.codes.get(name)
+        if code is None:
+            code = len(self.names)
+            self.names.append(name)
+            self.codes[name] = code
+        return code
+
+    # Return the label name of point `i`, or None if it has no label.
+    def name(self, i):
+        code = self.labels[i]
+        if code == UNASSIGNED:
+            return None
+        return self.names[code]
+
+    # Make sure the arrays can grow. Points loaded from a binary dataset
+    # file start out as read-only views on the memory-mapped file.
+    def make_writable(self):
+        if not isinstance(self.xs, array):
+            self.xs = array("d", self.xs.tobytes())
+            self.ys = array("d", self.ys.tobytes())
+        if not isinstance(self.labels, array):
+            self.labels = array("i", self.labels.tobytes())
+
+    # Add a point and return its index.
+    def add(self, x, y, name=None):
+        self.make_writable()
+        self.xs.append(x)
+        self.ys.append(y)
+        self.labels.append(self.label_code(name))
+        self.assignments.append(UNASSIGNED)
+        return len(self.xs) - 1
+
+    # Remove all points.
+    def clear(self):
+        self.__init__()
+
+    # Return the points' squared norms. They are computed once and extended
+    # as points are added, so repeated queries share them.
+    def sq_norms(self):
+        missing = len(self.xs) - len(self.norms)
+        if missing > 0:
+            start = len(self.norms)
+            self.norms.extend(kernels.sq_norms(self.xs[start:], self.ys[start:]))
+        return self.norms
+
+    # Return the squared distances from (x, y) to every point. Squared
+    # distances rank the same as real ones, so there is no need for sqrt.
+    def sq_distances(self, x, y):
+        metrics.count("distances", len(self.xs))
+        return kernels.sq_euclidean_to_many(x, y, self.xs, self.ys, self.sq_norms())
+
+    # Return the indices of the k points nearest to (x, y), nearest first.
+    # Ties keep index order, just like sorting the points would.
+    def nearest(self, x, y, k):
+        distances = self.sq_distances(x, y)
+        metrics.count("sorts")
+        return heapq.nsmallest(k, range(len(distances)), key=distances.__getitem__)
+
+    # Return the label name with the most votes among the given points.
+    # Ties go to the name that sorts first. Return None if none of the
+    # points is labelled.
+    def vote(self, indices):
+        counts = [0] * len(self.names)
+        labels = self.labels
+        for i in indices:
+            code = labels[i]
+            if code != UNASSIGNED:
+                counts[code] += 1
+        if not any(counts):
+            return None
+        return max(sorted(self.names), key=lambda name: counts[self.codes[name]])
+
+    # Use K nearest neighbors to predict the name of a point at (x, y).
+    def knn(self, x, y, k):
+        return self.vote(self.nearest(x, y, k))
+
+    # Reset all cluster assignments.
+    def clear_assignments(self):
+        self.assignments = array("i", [UNASSIGNED]) * len(self.xs)
+
+
+class GlyphSet:
+    # A compact collection of binary glyphs. Each glyph's 0s and 1s are
+    # packed into a single integer, so the distance between two glyphs is
+    # the popcount of their XOR. For 0/1 features this equals the squared
+    # Euclidean distance, so the ranking of neighbors is unchanged.
+    def __init__(self, num_features):
+        self.num_features = num_features
+        if num_features <= 64:
+            self.bits = array("Q")
+        else:
+            self.bits = []
+        self.labels = array("i")
+        self.names = []
+        self.codes = {}
+
+    def __len__(self):
+        return len(self.bits)
+
+    # Pack a string of 0s and 1s into an integer.
+    @staticmethod
+    def pack(zeros_and_ones):
+        return int(zeros_and_ones, 2)
+
+    # Parse a data string in the format
+    # '6: 011110110000100000111111110001110001010001001111'
+    # and return the name and the packed bits.
+    @staticmethod
+    def parse(data_string):
+        fields = data_string.split(" ")
+        return fields[0][0], GlyphSet.pack(fields[1].strip())
+
+    # Load glyphs from lines in the data string format.
+    @classmethod
+    def from_lines(cls, lines):
+        glyphs = None
+        for line in lines:
+            if not line.strip():
+                continue
+            fields = line.split(" ")
+            if glyphs is None:
+                glyphs = cls(len(fields[1].strip()))
+            glyphs.add(*cls.parse(line))
+        return glyphs
+
+    # Add a glyph and return its index.
+    def add(self, name, bits):
+        code = self.codes.get(name)
+        if code is None:
+            code = len(self.names)
+            self.names.append(name)
+            self.codes[name] = code
+        self.bits.append(bits)
+        self.labels.append(code)
+        return len(self.bits) - 1
+
+    # Return the label name of glyph `i`.
+    def name(self, i):
+        return self.names[self.labels[i]]
+
+    # Return the indices of the k glyphs nearest to `bits`, nearest first.
+    def nearest(self, bits, k):
+        distances = kernels.hamming_to_many(bits, self.bits)
+        metrics.count("distances", len(distances))
+        metrics.count("sorts")
+        return heapq.nsmallest(k, range(len(distances)), key=distances.__getitem__)
+
+    # Return the label name with the most votes among the given glyphs,
+    # nearest first. Ties go to the name that was seen first.
+    def vote(self, indices):
+        votes = {}
+        for i in indices:
+            name = self.names[self.labels[i]]
+            votes[name] = votes.get(name, 0) + 1
+        return max(votes, key=votes.get)
+
+    # Use K nearest neighbors to predict the name of a glyph.
+    def predict(self, bits, k):
+        return self.vote(self.nearest(bits, k))
@@ -0,0 +1,127 @@
+import atexit
+import cProfile
+import os
+import pstats
+import sys
+import threading
+from contextlib import contextmanager, nullcontext
+
+# Optional profiling shared by the apps. Only code inside `with
+# section():` is profiled, so an app's idle time in the Tk event loop is
+# left out. While enabled, cProfile measures every call for a summary
+# sorted by cumulative time, printed to standard error at exit, and a
+# sampling thread records the main thread's stack every SAMPLE_INTERVAL
+# seconds for a collapsed-stack file ("a;b;c count" lines) that flame
+# graph tools read. Everything is off until enable() is called.
+profiler = None
+sampler = None
+path = None
+depth = 0
+stacks = {}
+stopping = threading.Event()
+old_switch_interval = None
+
+# Seconds between stack samples. The interpreter's switch interval is
+# lowered to match while profiling, so the sampler gets to run on time.
+SAMPLE_INTERVAL = 0.001
+
+# Functions listed in the summary.
+SUMMARY_LINES = 30
+
+# What section() returns while disabled.
+NO_SECTION = nullcontext()
+
+
+# Turn profiling on. At exit the summary is printed and the collapsed
+# stacks are written to `collapsed_path`.
+def enable(collapsed_path):
+    global profiler, sampler, path, old_switch_interval
+    profiler = cProfile.Profile()
+    path = collapsed_path
+    old_switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(SAMPLE_INTERVAL)
+    sampler = threading.Thread(
+        target=sample, args=(threading.get_ident(),), daemon=True
+    )
+    sampler.start()
+    atexit.register(write)
+
+
+# Return a context manager that profiles the work inside it. Sections may
+# nest; only the outermost one switches the profiler on and off.
+def section():
+    if profiler is None:
+        return NO_SECTION
+    return profiled_section()
+
+
+@contextmanager
+def profiled_section():
+    global depth
+    if depth == 0:
+        profiler.enable()
+    depth += 1
+    try:
+        yield
+    finally:
+        depth -= 1
+        if depth == 0:
+            profiler.disable()
+
+
+# Return a frame's name for the collapsed stacks.
+def frame_name(frame):
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+# Sample the stack of the thread `thread_id` while it is in a section.
+def sample(thread_id):
+    while not stopping.wait(SAMPLE_INTERVAL):
+        if depth == 0:
+            continue
+        frame = sys._current_frames().get(thread_id)
+        names = []
+        while frame is not None:
+            names.append(frame_name(frame))
+            frame = frame.f_back
+        key = ";".join(reversed(names))
+        stacks[key] = stacks.get(key, 0) + 1
+
+
+# Stop profiling, print the summary and write the collapsed stacks.
+def write():
+    stopping.set()
+    sampler.join()
+    sys.setswitchinterval(old_switch_interval)
+    if depth > 0:
+        profiler.disable()
+
+    profiler.create_stats()
+    if profiler.stats:
+        stats = pstats.Stats(profiler, stream=sys.stderr)
+        stats.sort_stats("cumulative").print_stats(SUMMARY_LINES)
+    else:
+        print("Nothing was profiled", file=sys.stderr)
+    with open(path, "w") as f:
+        for key, count in sorted(stacks.items()):
+            f.write(f"{key} {count}\n")
+    num_samples = sum(stacks.values())
+    print(f"Wrote {num_samples} stack samples to {path}", file=sys.stderr)
+
+
+# Add the --profile option to an argument parser.
+def add_argument(parser):
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="profile the algorithmic work: print a summary and write "
+        "collapsed stacks to FILE",
+    )
+
+
+# Enable profiling if the parsed arguments ask for it.
+def configure(args):
+    if args.profile:
+        enable(args.profile)
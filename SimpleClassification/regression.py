@@ -0,0 +1,184 @@
+import argparse
+import math
+import random
+import sys
+from itertools import repeat
+
+import kmeans
+import kmodes
+from pointset import GlyphSet, PointSet
+
+# Deterministic checks that the optimized engines still give exactly the
+# results of the simple algorithms they replace. Run from the repository
+# root; the exit status is 1 if any check fails.
+
+# Points per generated dataset, the datasets' seeds, and the cluster
+# counts tried.
+NUM_POINTS = 2000
+HAMERLY_SEEDS = range(3)
+KS = [1, 2, 5, 12]
+MAX_ITERATIONS = 50
+
+# The indices of the items every seeding strategy picks for k = 5 from
+# seeding_data(), with random.Random(1). A change here changes every
+# seeded run, so it must be deliberate.
+EXPECTED_SEEDS = {
+    ("points", "random"): [68, 291, 433, 410, 391],
+    ("points", "k-means++"): [67, 425, 388, 120, 255],
+    ("points", "k-means||"): [91, 107, 272, 20, 365],
+    ("weighted", "random"): [68, 291, 433, 410, 391],
+    ("weighted", "k-means++"): [62, 425, 388, 113, 249],
+    ("weighted", "k-means||"): [2, 94, 58, 67, 8],
+    ("glyphs", "random"): [68, 291, 433, 410, 391],
+    ("glyphs", "k-means++"): [67, 424, 382, 125, 248],
+    ("glyphs", "k-means||"): [188, 199, 354, 345, 365],
+}
+
+
+# Return a PointSet of `n` points in Gaussian blobs on a coarse integer
+# grid, generated from `seed`. Rounding makes duplicate points and exact
+# distance ties, which is where assignment rules differ.
+def make_points(n, seed):
+    rng = random.Random(seed)
+    centers = [(rng.uniform(0, 300), rng.uniform(0, 300)) for _ in range(6)]
+    points = PointSet()
+    for _ in range(n):
+        cx, cy = centers[rng.randrange(len(centers))]
+        points.add(round(rng.gauss(cx, 25)), round(rng.gauss(cy, 25)))
+    return points
+
+
+# Perform one plain Lloyd iteration: assign every point to its nearest
+# center, ties going to the first, and move each center to the (weighted)
+# mean of its points. Return the assignments and the new centers.
+def lloyd_step(points, centers, weights=None):
+    k = len(centers)
+    sum_xs = [0.0] * k
+    sum_ys = [0.0] * k
+    counts = [0] * k
+    assignments = []
+    weights = repeat(1) if weights is None else weights
+    for x, y, w in zip(points.xs, points.ys, weights):
+        best = 0
+        best_distance = math.inf
+        for c, (cx, cy) in enumerate(centers):
+            d = (x - cx) * (x - cx) + (y - cy) * (y - cy)
+            if d < best_distance:
+                best, best_distance = c, d
+        assignments.append(best)
+        sum_xs[best] += w * x
+        sum_ys[best] += w * y
+        counts[best] += w
+    new_centers = [
+        (sum_x / count, sum_y / count) if count > 0 else center
+        for center, sum_x, sum_y, count in zip(centers, sum_xs, sum_ys, counts)
+    ]
+    return assignments, new_centers
+
+
+# Check that every Hamerly iteration gives exactly the assignments and
+# centers of a plain Lloyd iteration from the same centers. Return the
+# failures as messages.
+def check_hamerly():
+    failures = []
+    for seed in HAMERLY_SEEDS:
+        failures.extend(check_hamerly_seed(seed))
+    return failures
+
+
+# Check Hamerly on the dataset generated from `seed`.
+def check_hamerly_seed(seed):
+    failures = []
+    points = make_points(NUM_POINTS, seed)
+    rng = random.Random(seed)
+    for weights in (None, [rng.randint(1, 5) for _ in range(len(points))]):
+        for k in KS:
+            model = kmeans.KMeans(
+                points, k, "k-means++", random.Random(seed), weights=weights
+            )
+            model.seed()
+            centers = model.centers
+            for iteration in range(1, MAX_ITERATIONS + 1):
+                assignments, expected = lloyd_step(points, centers, weights)
+                model.step()
+                label = f"seed {seed}, k {k}, weighted {weights is not None}"
+                if list(points.assignments) != assignments:
+                    failures.append(f"{label}: assignments differ at {iteration}")
+                    break
+                if model.centers != expected:
+                    failures.append(f"{label}: centers differ at {iteration}")
+                    break
+                if expected == centers:
+                    break
+                centers = expected
+    return failures
+
+
+# Return 500 distinct points, weights for them and 500 distinct 48-bit
+# glyphs, all from a fixed seed.
+def seeding_data():
+    rng = random.Random(0)
+    points = PointSet()
+    for _ in range(500):
+        points.add(rng.uniform(0, 300), rng.uniform(0, 300))
+    weights = [rng.randint(1, 5) for _ in range(len(points))]
+    glyphs = GlyphSet(48)
+    for _ in range(500):
+        glyphs.add("0", rng.getrandbits(48))
+    return points, weights, glyphs
+
+
+# Check that the k-means and k-modes seeding strategies still pick
+# EXPECTED_SEEDS. Return the failures as messages.
+def check_seedings():
+    points, weights, glyphs = seeding_data()
+    point_index = {point: i for i, point in enumerate(zip(points.xs, points.ys))}
+    glyph_index = {bits: i for i, bits in enumerate(glyphs.bits)}
+    failures = []
+    for (kind, method), expected in EXPECTED_SEEDS.items():
+        rng = random.Random(1)
+        if kind == "glyphs":
+            seeds = kmodes.SEEDINGS[method](glyphs, 5, rng)
+            chosen = [glyph_index[bits] for bits in seeds]
+        else:
+            seeds = kmeans.SEEDINGS[method](
+                points, 5, rng, weights if kind == "weighted" else None
+            )
+            chosen = [point_index[point] for point in seeds]
+        if chosen != expected:
+            failures.append(f"{kind} {method}: chose {chosen}, expected {expected}")
+    return failures
+
+
+# The checks by name.
+CHECKS = {
+    "hamerly": check_hamerly,
+    "seedings": check_seedings,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that the clustering engines give their exact results."
+    )
+    parser.add_argument(
+        "checks", nargs="*", help=f"checks to run, of {', '.join(CHECKS)} (default all)"
+    )
+    args = parser.parse_args()
+    for name in args.checks:
+        if name not in CHECKS:
+            parser.error(f"unknown check: {name}")
+
+    num_failures = 0
+    for name in args.checks or CHECKS:
+        failures = CHECKS[name]()
+        print(f"{name}: {'ok' if not failures else 'FAILED'}")
+        for failure in failures:
+            print(f"  {failure}")
+        num_failures += len(failures)
+    if num_failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import colorsys
+import tkinter as tk
+
+import metrics
+from pointset import UNASSIGNED
+
+
+# Return the (offset, length) spans that make up a filled disc, one span per
+# row. Offsets are (dx, dy) pairs relative to the disc's center.
+def disc_spans(radius):
+    spans = []
+    for dy in range(-radius, radius + 1):
+        dx = int((radius * radius - dy * dy) ** 0.5)
+        spans.append((-dx, dy, 2 * dx + 1))
+    return spans
+
+
+# Return `count` distinct Tk color strings. Hues step around the color
+# wheel by the golden ratio so neighboring indices get very different
+# colors, and the saturation and value cycle so that large palettes stay
+# distinguishable.
+def palette(count):
+    colors = []
+    for i in range(count):
+        hue = (i * 0.618033988749895) % 1.0
+        saturation = (0.9, 0.6, 1.0)[i % 3]
+        value = (0.95, 0.75, 0.55)[(i // 3) % 3]
+        r, g, b = colorsys.hsv_to_rgb(hue, saturation, value)
+        colors.append(f"#{int(r * 255):02x}{int(g * 255):02x}{int(b * 255):02x}")
+    return colors
+
+
+class Raster:
+    # An RGB pixel buffer that points are stamped into in bulk. Each color
+    # is turned into a disc stamp once: a list of (byte offset, row bytes)
+    # pairs, so drawing a point is one slice assignment per row.
+    def __init__(self, width, height, radius, background=(255, 255, 255)):
+        self.width = width
+        self.height = height
+        self.radius = radius
+        self.background = bytes(background)
+        self.spans = disc_spans(radius)
+        self.stamps = {}
+        self.header = f"P6 {width} {height} 255\n".encode("ascii")
+        self.pixels = bytearray(self.background * (width * height))
+
+    # Fill the buffer with the background color.
+    def clear(self):
+        self.pixels[:] = self.background * (self.width * self.height)
+
+    # Return the stamp for an (r, g, b) color.
+    def stamp(self, rgb):
+        stamp = self.stamps.get(rgb)
+        if stamp is None:
+            pixel = bytes(rgb)
+            stamp = [
+                (3 * (dy * self.width + dx), pixel * length)
+                for dx, dy, length in self.spans
+            ]
+            self.stamps[rgb] = stamp
+        return stamp
+
+    # Draw one point, clipping it against the buffer's edges.
+    def draw_point(self, x, y, rgb):
+        x, y = int(x), int(y)
+        radius = self.radius
+        if radius <= x < self.width - radius and radius <= y < self.height - radius:
+            base = 3 * (y * self.width + x)
+            pixels = self.pixels
+            for offset, row in self.stamp(rgb):
+                start = base + offset
+                pixels[start : start + len(row)] = row
+            return
+
+        pixel = bytes(rgb)
+        for dx, dy, length in self.spans:
+            row = y + dy
+            if row < 0 or row >= self.height:
+                continue
+            left = max(x + dx, 0)
+            right = min(x + dx + length, self.width)
+            if left < right:
+                start = 3 * (row * self.width + left)
+                self.pixels[start : start + 3 * (right - left)] = pixel * (right - left)
+
+    # Draw many points. `codes` index into `palette`, a list of (r, g, b)
+    # colors; points with code UNASSIGNED use `default`.
+    def draw_points(self, xs, ys, codes, palette, default):
+        # Points that land on the same pixel hide each other, so stamp each
+        # pixel only once, in the color of the last point drawn there. This
+        # bounds the stamping work by the image size instead of the number
+        # of points. Points centered outside the image are skipped.
+        width = self.width
+        height = self.height
+        centers = {}
+        for x, y, code in zip(xs, ys, codes):
+            if 0 <= x < width and 0 <= y < height:
+                centers[int(y) * width + int(x)] = code
+
+        stamps = [self.stamp(rgb) for rgb in palette]
+        default_stamp = self.stamp(default)
+        pixels = self.pixels
+        radius = self.radius
+        max_x = self.width - radius
+        max_y = self.height - radius
+        for center, code in centers.items():
+            y, x = divmod(center, width)
+            if not (radius <= x < max_x and radius <= y < max_y):
+                rgb = default if code == UNASSIGNED else palette[code]
+                self.draw_point(x, y, rgb)
+                continue
+            base = 3 * center
+            stamp = default_stamp if code == UNASSIGNED else stamps[code]
+            for offset, row in stamp:
+                start = base + offset
+                pixels[start : start + len(row)] = row
+
+    # Return the buffer as binary PPM data.
+    def ppm(self):
+        return self.header + bytes(self.pixels)
+
+
+class PointRenderer:
+    # Draw large numbers of points on a canvas as a single PhotoImage
+    # instead of one canvas item per point. Points are rasterized into a
+    # Raster and the whole image is re-blitted when the data changes.
+    # Seeds and highlighted points should still be drawn as canvas items.
+    def __init__(self, canvas, width, height, radius):
+        self.canvas = canvas
+        self.raster = Raster(width, height, radius)
+        self.image = tk.PhotoImage(width=width, height=height)
+        self.colors = {}
+        self.item = None
+        self.reset()
+
+    # Clear the points and (re)create the canvas item. Call this after
+    # deleting everything on the canvas.
+    def reset(self):
+        self.raster.clear()
+        self.item = self.canvas.create_image(0, 0, image=self.image, anchor=tk.NW)
+        self.canvas.tag_lower(self.item)
+        metrics.count("canvas_ops", 2)
+        self.blit()
+
+    # Return the (r, g, b) value of a Tk color name.
+    def rgb(self, color):
+        rgb = self.colors.get(color)
+        if rgb is None:
+            rgb = tuple(value >> 8 for value in self.canvas.winfo_rgb(color))
+            self.colors[color] = rgb
+        return rgb
+
+    # Draw one point. Call blit() to show it.
+    def draw_point(self, x, y, color):
+        self.raster.draw_point(x, y, self.rgb(color))
+
+    # Clear the buffer and draw all points. `codes` index into `colors`, a
+    # list of Tk color names; unassigned points use `default`.
+    def draw_points(self, xs, ys, codes, colors, default):
+        with metrics.phase("rendering"):
+            self.raster.clear()
+            palette = [self.rgb(color) for color in colors]
+            self.raster.draw_points(xs, ys, codes, palette, self.rgb(default))
+            self.blit()
+
+    # Redraw only the points at `indices`, for example those whose cluster
+    # changed, on top of the current buffer, and blit once. Nothing is
+    # done when the list is empty.
+    def update_points(self, xs, ys, codes, indices, colors, default):
+        if len(indices) == 0:
+            return
+        with metrics.phase("rendering"):
+            palette = [self.rgb(color) for color in colors]
+            self.raster.draw_points(
+                [xs[i] for i in indices],
+                [ys[i] for i in indices],
+                [codes[i] for i in indices],
+                palette,
+                self.rgb(default),
+            )
+            self.blit()
+
+    # Copy the buffer to the PhotoImage.
+    def blit(self):
+        metrics.count("canvas_ops")
+        self.image.configure(data=self.raster.ppm(), format="PPM")
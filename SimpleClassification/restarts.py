@@ -0,0 +1,86 @@
+import random
+from array import array
+from multiprocessing import Pool, shared_memory
+
+import kmeans
+from pointset import PointSet
+
+# The points shared with the worker processes, attached once per worker.
+shared = None
+shared_points = None
+shared_weights = None
+
+
+# Attach a worker process to the shared point coordinates, and to the
+# point weights if there are any.
+def attach(name, count, weighted):
+    global shared, shared_points, shared_weights
+    shared = shared_memory.SharedMemory(name=name)
+    shared_points = PointSet()
+    shared_points.xs = shared.buf[: 8 * count].cast("d")
+    shared_points.ys = shared.buf[8 * count : 16 * count].cast("d")
+    shared_points.labels = array("i")
+    if weighted:
+        shared_weights = shared.buf[16 * count : 24 * count].cast("d")
+
+
+# Run one restart in a worker. Only the centers and scores travel back to
+# the parent; the point arrays never leave shared memory.
+def run_restart(task):
+    k, method, rng_seed, stop_distance, max_iterations = task
+    model = kmeans.KMeans(
+        shared_points,
+        k,
+        method,
+        random.Random(rng_seed),
+        stop_distance,
+        max_iterations,
+        shared_weights,
+    ).run()
+    return model.inertia(), model.centers, model.iterations
+
+
+# Call `function` on every task across a process pool and return the
+# results in order. The point coordinates, and weights if there are any,
+# are copied once into shared memory instead of being pickled for every
+# task; workers find them in `shared_points` and `shared_weights`.
+def map_shared(points, function, tasks, processes=None, weights=None):
+    count = len(points)
+    weighted = weights is not None
+    size = (24 if weighted else 16) * count
+    memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        memory.buf[: 8 * count] = memoryview(points.xs).cast("B")
+        memory.buf[8 * count : 16 * count] = memoryview(points.ys).cast("B")
+        if weighted:
+            memory.buf[16 * count : size] = memoryview(array("d", weights)).cast("B")
+        with Pool(
+            processes, initializer=attach, initargs=(memory.name, count, weighted)
+        ) as pool:
+            return pool.map(function, tasks)
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+# Run `num_restarts` independent k-means runs across a process pool and
+# return the results sorted by inertia, best first, as a list of
+# (inertia, centers, iterations) tuples. Each restart gets its own seed
+# drawn from `rng`, so the whole set of restarts is reproducible. Weighted
+# points, such as a coreset, are shared along with their weights.
+def run_restarts(
+    points,
+    k,
+    num_restarts,
+    method,
+    rng,
+    stop_distance=1.0,
+    max_iterations=None,
+    processes=None,
+    weights=None,
+):
+    rng_seeds = [rng.randrange(2**32) for _ in range(num_restarts)]
+    tasks = [(k, method, s, stop_distance, max_iterations) for s in rng_seeds]
+    results = map_shared(points, run_restart, tasks, processes, weights)
+    results.sort(key=lambda result: result[0])
+    return results
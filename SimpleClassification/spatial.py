@@ -0,0 +1,165 @@
+import heapq
+import math
+
+import metrics
+from kernels import sq_euclidean
+from pointset import UNASSIGNED
+
+
+class GridIndex:
+    # A uniform grid over the points of a PointSet. Each cell holds the
+    # indices of the points that fall in it, so nearest-neighbor and range
+    # queries only look at the cells near the query point.
+    def __init__(self, points, cell_size):
+        self.points = points
+        self.cell_size = cell_size
+        self.cells = {}
+        self.min_cell = None
+        self.max_cell = None
+        for i in range(len(points)):
+            self.insert(i)
+
+    # Return the (column, row) of the cell holding (x, y).
+    def cell(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    # Add point `i` of the PointSet to the index.
+    def insert(self, i):
+        column, row = self.cell(self.points.xs[i], self.points.ys[i])
+        self.cells.setdefault((column, row), []).append(i)
+        if self.min_cell is None:
+            self.min_cell = [column, row]
+            self.max_cell = [column, row]
+        else:
+            self.min_cell = [min(self.min_cell[0], column), min(self.min_cell[1], row)]
+            self.max_cell = [max(self.max_cell[0], column), max(self.max_cell[1], row)]
+
+    # Return the cells at Chebyshev distance `ring` from (column, row).
+    def ring_cells(self, column, row, ring):
+        if ring == 0:
+            return [(column, row)]
+        cells = []
+        for c in range(column - ring, column + ring + 1):
+            cells.append((c, row - ring))
+            cells.append((c, row + ring))
+        for r in range(row - ring + 1, row + ring):
+            cells.append((column - ring, r))
+            cells.append((column + ring, r))
+        return cells
+
+    # Return True if the block of rings 0..ring around (column, row) covers
+    # every non-empty cell.
+    def covers_all(self, column, row, ring):
+        return (
+            column - ring <= self.min_cell[0]
+            and row - ring <= self.min_cell[1]
+            and column + ring >= self.max_cell[0]
+            and row + ring >= self.max_cell[1]
+        )
+
+    # Return the distance from (x, y) to the outside of the block of rings
+    # 0..ring around its cell. No point outside the block is closer.
+    def block_margin(self, x, y, column, row, ring):
+        size = self.cell_size
+        return min(
+            x - (column - ring) * size,
+            (column + ring + 1) * size - x,
+            y - (row - ring) * size,
+            (row + ring + 1) * size - y,
+        )
+
+    # Return the squared distance from (x, y) to the nearest point of a
+    # cell, which is 0 inside it.
+    def cell_distance2(self, x, y, cell):
+        size = self.cell_size
+        column, row = cell
+        dx = max(column * size - x, 0.0, x - (column + 1) * size)
+        dy = max(row * size - y, 0.0, y - (row + 1) * size)
+        return dx * dx + dy * dy
+
+    # Return the k points nearest to (x, y) as a sorted list of
+    # (squared distance, index) pairs, skipping point `exclude`. Ties are
+    # broken by index, just like a stable sort of all points would.
+    def nearest(self, x, y, k, exclude=UNASSIGNED):
+        return self.search(x, y, k, exclude, 0.0, None)[0]
+
+    # Approximate KNN. Return (neighbors, guaranteed): the neighbors are
+    # within a factor (1 + epsilon) of the true ith-nearest distances as
+    # long as the search stayed within `max_cells` cells, which is what
+    # `guaranteed` reports. With max_cells None the search is unbounded.
+    def approx_nearest(self, x, y, k, epsilon, max_cells=None, exclude=UNASSIGNED):
+        return self.search(x, y, k, exclude, epsilon, max_cells)
+
+    # Search rings of cells outward, keeping the best k in a max-heap of
+    # (-d2, -index). Stop once no unvisited point can be closer than the
+    # kth distance divided by (1 + epsilon), or when the cell budget runs
+    # out. The budget only applies once k candidates have been found, so
+    # a query far from the points still gets k neighbors.
+    def search(self, x, y, k, exclude, epsilon, max_cells):
+        if k <= 0 or self.min_cell is None:
+            return [], True
+        xs, ys = self.points.xs, self.points.ys
+        column, row = self.cell(x, y)
+        slack2 = (1 + epsilon) ** 2
+
+        best = []
+        ring = 0
+        num_cells = 0
+        num_distances = 0
+        guaranteed = True
+        while True:
+            for cell in self.ring_cells(column, row, ring):
+                num_cells += 1
+                members = self.cells.get(cell, ())
+                num_distances += len(members)
+                for i in members:
+                    if i == exclude:
+                        continue
+                    # kernels.sq_euclidean, inlined for the inner loop.
+                    dx = xs[i] - x
+                    dy = ys[i] - y
+                    entry = (-(dx * dx + dy * dy), -i)
+                    if len(best) < k:
+                        heapq.heappush(best, entry)
+                    elif entry > best[0]:
+                        heapq.heapreplace(best, entry)
+            if self.covers_all(column, row, ring):
+                break
+            if len(best) == k:
+                margin = self.block_margin(x, y, column, row, ring)
+                if -best[0][0] < margin * margin * slack2:
+                    break
+            if max_cells is not None and num_cells >= max_cells and len(best) == k:
+                guaranteed = False
+                break
+            ring += 1
+        metrics.count("distances", num_distances)
+        metrics.count("sorts")
+        return sorted((-d2, -i) for d2, i in best), guaranteed
+
+    # Compare approximate KNN against the exact PointSet.knn at the given
+    # query points. Return (agreement, worst_ratio, guaranteed): the
+    # fraction of queries with the same prediction, the largest ratio of
+    # approximate to exact kth-neighbor distance, and the fraction of
+    # queries that stayed within the cell budget. Queries without any
+    # neighbors have no prediction and count as disagreeing.
+    def measure_agreement(self, queries, k, epsilon, max_cells=None):
+        agree = 0
+        num_guaranteed = 0
+        worst_ratio = 1.0
+        for x, y in queries:
+            neighbors, guaranteed = self.approx_nearest(x, y, k, epsilon, max_cells)
+            exact = self.points.nearest(x, y, k)
+            prediction = self.points.vote(i for _, i in neighbors)
+            if prediction is not None and prediction == self.points.vote(exact):
+                agree += 1
+            num_guaranteed += guaranteed
+            if len(neighbors) > 0:
+                j = exact[len(neighbors) - 1]
+                exact_d2 = sq_euclidean(self.points.xs[j], self.points.ys[j], x, y)
+                if exact_d2 > 0:
+                    worst_ratio = max(
+                        worst_ratio, math.sqrt(neighbors[-1][0] / exact_d2)
+                    )
+        num_queries = max(len(queries), 1)
+        return agree / num_queries, worst_ratio, num_guaranteed / num_queries
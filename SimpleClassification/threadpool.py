@@ -0,0 +1,82 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Points handled by one task. A chunk's coordinates, bounds and
+# assignments take about 100 KB, so each thread works on data that fits in
+# its core's cache, and there are enough chunks to balance the threads.
+CHUNK_SIZE = 4096
+
+# One executor per thread count, created on first use and kept, so steps
+# do not pay for starting threads.
+executors = {}
+
+
+# Return True if the interpreter has a global interpreter lock. With the
+# lock, the pure-Python kernels take turns and threads add no speed; a
+# free-threaded build runs them in parallel.
+def gil_enabled():
+    check = getattr(sys, "_is_gil_enabled", None)
+    return True if check is None else check()
+
+
+# Return the number of threads to actually use for a request of `threads`:
+# one while the GIL is enabled, so the serial path runs instead.
+def usable_threads(threads):
+    return 1 if gil_enabled() else threads
+
+
+# Return the executor that runs `threads` threads.
+def executor(threads):
+    pool = executors.get(threads)
+    if pool is None:
+        pool = executors[threads] = ThreadPoolExecutor(threads)
+    return pool
+
+
+# Split range(count) into consecutive (start, end) chunks.
+def chunk_ranges(count, chunk_size=CHUNK_SIZE):
+    return [
+        (start, min(start + chunk_size, count)) for start in range(0, count, chunk_size)
+    ]
+
+
+# Return items start to end of an array or memoryview without copying
+# them. A whole sequence is returned as is.
+def view(sequence, start, end):
+    if start == 0 and end == len(sequence):
+        return sequence
+    try:
+        return memoryview(sequence)[start:end]
+    except TypeError:
+        return sequence[start:end]
+
+
+# Call function(start, end) for every chunk of range(count) and return the
+# results in chunk order, so merging them does not depend on timing. The
+# threads share whatever the function reads; each chunk must only write
+# its own slice of the outputs. With one usable thread, or one chunk, the
+# calls run in the caller's thread.
+def map_chunks(function, count, threads, chunk_size=CHUNK_SIZE):
+    ranges = chunk_ranges(count, chunk_size)
+    if usable_threads(threads) <= 1 or len(ranges) <= 1:
+        return [function(start, end) for start, end in ranges]
+    return list(executor(threads).map(lambda r: function(*r), ranges))
+
+
+# Add a --threads option to an argument parser.
+def add_argument(parser):
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="threads for the distance kernels (used only without the GIL)",
+    )
+
+
+# Say so when the requested threads cannot run in parallel.
+def check(threads):
+    if threads > 1 and gil_enabled():
+        print(
+            f"Note: the GIL is enabled, so --threads {threads} is ignored "
+            "and the kernels run in one thread."
+        )